@@ -0,0 +1,180 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy.linalg import solve_triangular
+from sklearn.gaussian_process import GaussianProcessRegressor
+from sklearn.utils import check_random_state
+from gp_fitting import normalize_targets
+from gp_predictor import rbf_parameters
+
+# Relative variance floor; float32 Cholesky inverses do not resolve a posterior variance below it
+VARIANCE_FLOOR = 16 * np.finfo(np.float32).eps
+
+
+class CommitteeGaussianProcessRegressor:
+    """
+    Bayesian committee of exact GP experts, each fitted on one shard of the training windows.
+
+    The windows are shuffled and split into shards of about shard_size, so every window is used
+    by exactly one expert. The experts are independent GaussianProcessRegressors, each with its own
+    hyperparameter optimization, fitted in parallel on a process pool. At prediction time every
+    expert gives a mean and a variance, which are combined in precision-weighted form:
+
+    - 'poe': product of experts, precisions add up
+    - 'gpoe': generalized product of experts, each expert weighted 1 / n_experts
+    - 'bcm': Bayesian committee machine, corrected by the prior precision
+    - 'rbcm': robust BCM, each expert weighted by how much it reduces the prior entropy
+
+    Targets are normalized once over all windows, so every expert shares the same zero prior
+    mean. The fitted experts are stored as stacked arrays and evaluated in batched GEMMs like
+    FastGPPredictor. The cached Cholesky inverses take n_train * shard_size * 4 bytes, as they
+    are stored in float32 (about 1.1 GB for 1.4M windows in shards of 200), and every query
+    costs O(n_train * shard_size) over all experts. The batched evaluation rebuilds each expert's
+    kernel from its fitted parameters, so the kernel must be one gp_predictor.rbf_parameters accepts.
+    """
+    def __init__(self, kernel, shard_size=200, combine='rbcm', alpha=1e-9, normalize_y=True,
+                 optimizer='fmin_l_bfgs_b', n_restarts_optimizer=0, workers=1, chunk_size=4_000_000,
+                 random_state=None):
+        self.kernel = kernel
+        self.shard_size = shard_size
+        self.combine = combine
+        self.alpha = alpha
+        self.normalize_y = normalize_y
+        self.optimizer = optimizer
+        self.n_restarts_optimizer = n_restarts_optimizer
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.random_state = random_state
+
+    def fit(self, X, y):
+        """
+        Fit one expert per shard of the training windows.
+
+        Args:
+        - X: Training windows, shape (n_samples, window_size); any array supporting row indexing
+        - y: Next-note targets, shape (n_samples,)
+
+        Returns:
+        - self
+        """
+        if self.combine not in ('poe', 'gpoe', 'bcm', 'rbcm'):
+            raise ValueError(f"Unknown combination rule: {self.combine}")
+        rng = check_random_state(self.random_state)
+        # Normalize the targets once over all windows, so the experts share one zero-mean prior
+        y, self._y_train_mean, self._y_train_std = normalize_targets(y, self.normalize_y)
+
+        # Shuffle and split into near-equal shards; each expert gets its own seed for the restarts
+        n_experts = max(1, -(-len(X) // self.shard_size))
+        shards = np.array_split(rng.permutation(len(X)), n_experts)
+        seeds = rng.randint(np.iinfo(np.int32).max, size=n_experts)
+        tasks = [(np.asarray(X[np.sort(shard)], dtype=np.float64), y[np.sort(shard)], self.kernel, self.alpha,
+                  self.optimizer, self.n_restarts_optimizer, seed) for shard, seed in zip(shards, seeds)]
+
+        if self.workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                experts = list(executor.map(_fit_expert, tasks, chunksize=max(1, len(tasks) // (4 * self.workers))))
+        else:
+            experts = [_fit_expert(task) for task in tasks]
+        self._stack_experts([task[0] for task in tasks], experts)
+        self.n_train_ = len(X)
+        return self
+
+    def _stack_experts(self, X_shards, experts):
+        """Store the experts as zero-padded stacks, in the fused-RBF form used by FastGPPredictor"""
+        n_experts, window_size = len(experts), X_shards[0].shape[1]
+        shard_size = max(len(X_shard) for X_shard in X_shards)
+        self.kernels_ = [kernel for kernel, _, _ in experts]
+        self.inv_length_scale_ = np.empty((n_experts, window_size))
+        self.amplitude_ = np.empty(n_experts)
+        self.noise_level_ = np.empty(n_experts)
+        # Padded slots get bias -inf, so their kernel value, weight and variance term are all 0
+        self.X_train_T_ = np.zeros((n_experts, window_size, shard_size))
+        self.bias_ = np.full((n_experts, shard_size), -np.inf)
+        self.alpha_ = np.zeros((n_experts, shard_size))
+        self.L_inv_T_ = np.zeros((n_experts, shard_size, shard_size), dtype=np.float32)
+        for i, (X_shard, (kernel, alpha, L_inv)) in enumerate(zip(X_shards, experts)):
+            amplitude, length_scale, noise_level = rbf_parameters(kernel)
+            n = len(X_shard)
+            self.inv_length_scale_[i] = 1.0 / np.asarray(length_scale, dtype=np.float64)
+            self.amplitude_[i], self.noise_level_[i] = amplitude, noise_level
+            X_scaled = X_shard * self.inv_length_scale_[i]
+            self.X_train_T_[i, :, :n] = (X_scaled * self.inv_length_scale_[i]).T
+            self.bias_[i, :n] = np.log(amplitude) - 0.5 * np.einsum('ij,ij->i', X_scaled, X_scaled)
+            self.alpha_[i, :n] = alpha
+            self.L_inv_T_[i, :n, :n] = L_inv.T
+
+    def _expert_moments(self, X, experts):
+        """Normalized mean and variance of a slice of experts for every query, shape (n_experts, n_queries)"""
+        X_scaled = X[None, :, :] * self.inv_length_scale_[experts, None, :]
+        log_K = np.matmul(X, self.X_train_T_[experts])
+        log_K += self.bias_[experts, None, :]
+        log_K -= 0.5 * np.einsum('kqd,kqd->kq', X_scaled, X_scaled)[:, :, None]
+        np.minimum(log_K, np.log(self.amplitude_[experts])[:, None, None], out=log_K)
+        K_trans = np.exp(log_K, out=log_K)
+
+        mean = np.einsum('kqm,km->kq', K_trans, self.alpha_[experts])
+        # Single-precision GEMM against the float32 inverses; the squared norms are summed in float64
+        V = np.matmul(K_trans.astype(np.float32), self.L_inv_T_[experts])
+        prior_var = (self.amplitude_[experts] + self.noise_level_[experts])[:, None]
+        var = prior_var - np.einsum('kqm,kqm->kq', V, V, dtype=np.float64)
+        # Floor the variance so a near-interpolating expert gets a large but finite precision
+        return mean, np.maximum(var, VARIANCE_FLOOR * prior_var)
+
+    def predict(self, X, return_std=False):
+        """
+        Predict the next note for each query window from the combined experts.
+
+        Args:
+        - X: Query windows, shape (n_queries, window_size)
+        - return_std: Whether to also return the predictive standard deviation
+
+        Returns:
+        - y_mean, and y_std if return_std is True
+        """
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        n_experts, _, shard_size = self.X_train_T_.shape
+        weighted_mean = np.zeros(len(X))
+        precision = np.zeros(len(X))
+        total_weight = np.zeros(len(X))
+
+        # Accumulate the precision-weighted sums over chunks of experts to bound the memory
+        experts_per_chunk = max(1, self.chunk_size // max(1, len(X) * shard_size))
+        for start in range(0, n_experts, experts_per_chunk):
+            experts = slice(start, start + experts_per_chunk)
+            mean, var = self._expert_moments(X, experts)
+            prior_var = (self.amplitude_[experts] + self.noise_level_[experts])[:, None]
+            if self.combine == 'rbcm':
+                # Differential entropy between prior and posterior
+                weight = 0.5 * (np.log(prior_var) - np.log(var))
+            elif self.combine == 'gpoe':
+                weight = np.full_like(var, 1.0 / n_experts)
+            else:
+                weight = np.ones_like(var)
+            weighted_mean += np.sum(weight * mean / var, axis=0)
+            precision += np.sum(weight / var, axis=0)
+            total_weight += np.sum(weight, axis=0)
+
+        if self.combine in ('bcm', 'rbcm'):
+            # Remove the prior precision counted once per expert too many
+            precision += (1.0 - total_weight) / np.mean(self.amplitude_ + self.noise_level_)
+            # The posterior is never less certain than the prior
+            precision = np.maximum(precision, 1.0 / np.max(self.amplitude_ + self.noise_level_))
+        y_var = 1.0 / precision
+        y_mean = self._y_train_std * weighted_mean * y_var + self._y_train_mean
+        if not return_std:
+            return y_mean
+        return y_mean, np.sqrt(y_var) * self._y_train_std
+
+
+def _fit_expert(task):
+    """Fit one expert GP; returns its kernel, alpha and the inverse of its Cholesky factor"""
+    X, y, kernel, alpha, optimizer, n_restarts_optimizer, seed = task
+    gp = GaussianProcessRegressor(
+        kernel=kernel,
+        alpha=alpha,
+        optimizer=optimizer,
+        n_restarts_optimizer=n_restarts_optimizer,
+        normalize_y=False,
+        random_state=seed,
+    )
+    gp.fit(X, y)
+    return gp.kernel_, gp.alpha_, solve_triangular(gp.L_, np.eye(len(X)), lower=True)
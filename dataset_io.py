@@ -0,0 +1,155 @@
+import argparse
+import numpy as np
+import pandas as pd
+from windowing import concat_sequences, parse_sequences
+
+FORMAT_VERSION = 2
+# Version 1 stored melody strings as a fixed-width unicode array; it is still read
+SUPPORTED_FORMAT_VERSIONS = (1, 2)
+N_OPTIONS = 10
+
+
+def save_dataset(path, offsets=None, pitches=None, normalized=None, input_pitch=None, options=None, melody=None,
+                 metadata=None, dtype=np.float32):
+    """
+    Save a melody dataset as an uncompressed .npz archive.
+
+    Melodies are stored as one flat array plus an offsets array; melody i is
+    pitches[offsets[i]:offsets[i + 1]]. Melody strings use the same layout, as one utf-8 byte
+    buffer plus offsets. Test sets additionally carry fixed-shape input and option tensors.
+
+    Args:
+    - path: Output .npz path
+    - offsets: Melody boundaries, shape (n_melodies + 1,); required with pitches or normalized
+    - pitches: Flat MIDI pitch array, stored as uint8
+    - normalized: Flat normalized pitch array, stored as `dtype`
+    - input_pitch: Test inputs, shape (n_cases, input_length)
+    - options: Test options, shape (n_cases, n_options, option_length)
+    - melody: Melody strings or names, shape (n_melodies,)
+    - metadata: dict of per-melody columns (e.g. cantus_id, mode), stored under 'meta_<name>'
+    - dtype: Float dtype used for normalized values, inputs and options
+
+    Returns:
+    - None
+    """
+    arrays = {'format_version': np.array(FORMAT_VERSION)}
+    if offsets is not None:
+        arrays['offsets'] = np.asarray(offsets, dtype=np.int64)
+    if pitches is not None:
+        arrays['pitches'] = np.asarray(pitches, dtype=np.uint8)
+    if normalized is not None:
+        arrays['normalized'] = np.asarray(normalized, dtype=dtype)
+    if input_pitch is not None:
+        arrays['input_pitch'] = np.asarray(input_pitch, dtype=dtype)
+    if options is not None:
+        arrays['options'] = np.asarray(options, dtype=dtype)
+    if melody is not None:
+        arrays['melody_text'], arrays['melody_offsets'] = encode_strings(melody)
+    for name, values in (metadata or {}).items():
+        values = np.asarray(values)
+        arrays[f'meta_{name}'] = values.astype(str) if values.dtype == object else values
+    np.savez(path, **arrays)
+
+
+def load_dataset(path):
+    """
+    Load a dataset written by save_dataset.
+
+    Returns:
+    - dict of arrays with the keys that were saved ('offsets', 'pitches', 'normalized',
+      'input_pitch', 'options', 'melody', and 'meta_<name>' for each metadata column)
+    """
+    with np.load(path, allow_pickle=False) as archive:
+        dataset = {key: archive[key] for key in archive.files}
+    if int(dataset.pop('format_version')) not in SUPPORTED_FORMAT_VERSIONS:
+        raise ValueError(f"Unsupported dataset format in {path}")
+    if 'melody_text' in dataset:
+        dataset['melody'] = decode_strings(dataset.pop('melody_text'), dataset.pop('melody_offsets'))
+    return dataset
+
+
+def encode_strings(strings):
+    """
+    Pack strings into one utf-8 byte buffer plus offsets; string i is text[offsets[i]:offsets[i + 1]].
+
+    Returns:
+    - text, uint8 array, and offsets, int64 array of shape (n_strings + 1,)
+    """
+    encoded = [str(string).encode('utf-8') for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(string) for string in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def decode_strings(text, offsets):
+    """Unpack strings packed by encode_strings, as an object array of str"""
+    text = np.asarray(text, dtype=np.uint8).tobytes()
+    strings = np.empty(len(offsets) - 1, dtype=object)
+    strings[:] = [text[start:end].decode('utf-8') for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+    return strings
+
+
+def column_to_arrays(column, dtype=np.float64):
+    """
+    Flatten a DataFrame column of sequences, either stringified lists (as read from CSV) or Python lists.
+
+    Returns:
+    - buffer, offsets
+    """
+    sequences = list(column)
+    if sequences and isinstance(sequences[0], str):
+        return parse_sequences(sequences, dtype=dtype)
+    return concat_sequences(sequences, dtype=dtype)
+
+
+def parse_fixed_length(sequence_strings, dtype=np.float64):
+    """
+    Parse a column of sequences that all have the same length into a 2D array.
+
+    Returns:
+    - array, shape (n_rows, sequence_length)
+    """
+    buffer, offsets = column_to_arrays(sequence_strings, dtype=dtype)
+    lengths = np.diff(offsets)
+    if len(lengths) and np.any(lengths != lengths[0]):
+        raise ValueError("Sequences must all have the same length")
+    return buffer.reshape(len(lengths), lengths[0] if len(lengths) else 0)
+
+
+def dataset_from_dataframe(df):
+    """
+    Convert a dataset DataFrame with list or stringified-list columns to the arrays used by save_dataset.
+
+    Option columns are only included when every option_1..option_10 column is filled in;
+    otherwise just option_1 is kept, as written by preprocess_data.py. The melody strings are
+    left out, since training and evaluation only read the pitch arrays.
+
+    Returns:
+    - dict of keyword arguments for save_dataset
+    """
+    arrays = {}
+    if 'normalized_pitch_sequence' in df:
+        arrays['normalized'], arrays['offsets'] = column_to_arrays(df['normalized_pitch_sequence'])
+    if 'pitch_sequence' in df:
+        pitches, offsets = column_to_arrays(df['pitch_sequence'])
+        arrays['pitches'] = pitches
+        arrays.setdefault('offsets', offsets)
+    if 'input_pitch' in df:
+        arrays['input_pitch'] = parse_fixed_length(df['input_pitch'])
+
+    option_columns = [f'option_{i}' for i in range(1, N_OPTIONS + 1)]
+    if all(column in df and df[column].notna().all() for column in option_columns):
+        arrays['options'] = np.stack([parse_fixed_length(df[column]) for column in option_columns], axis=1)
+    elif 'option_1' in df and df['option_1'].notna().all():
+        arrays['options'] = parse_fixed_length(df['option_1'])[:, None, :]
+    return arrays
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a stringified-list dataset CSV to the binary .npz format.")
+    parser.add_argument('input_csv', help='Path to the dataset CSV file.')
+    parser.add_argument('output_npz', help='Path to the output .npz file.')
+    args = parser.parse_args()
+
+    save_dataset(args.output_npz, **dataset_from_dataframe(pd.read_csv(args.input_csv)))
+    print(f"Dataset saved to {args.output_npz}")
@@ -0,0 +1,124 @@
+import numpy as np
+from scipy.linalg import cho_solve, cholesky, eigh, solve_triangular
+from sklearn.utils import check_random_state
+from gp_fitting import fit_subset_kernel, normalize_targets
+from gp_predictor import rbf_parameters
+
+
+class FeatureGaussianProcessRegressor:
+    """
+    Approximate RBF Gaussian Process as Bayesian linear regression on an explicit feature map.
+
+    Windows are mapped to n_features features phi(x) with phi(x).phi(x') ~ k(x, x'):
+
+    - features='rff': random Fourier features, sqrt(2 * amplitude / D) * cos(x.w + b) with
+      w ~ N(0, 1 / length_scale^2) and b ~ U(0, 2 pi)
+    - features='nystrom': k(x, Z) K_ZZ^-1/2 over n_features landmark windows Z
+
+    Fitting streams over the training windows in chunks and only keeps the running sums Phi^T Phi
+    and Phi^T y, so every window is used with O(n_features^2) memory and O(N * n_features^2) time.
+    Prediction is one GEMM for the mean, and the variance comes from the n_features x n_features
+    posterior (for Nystrom plus the prior variance outside the landmarks' span, so with every
+    training window as a landmark it reproduces the exact GP). Both feature maps are built from
+    the RBF length scale and amplitude, so the kernel must be one gp_predictor.rbf_parameters accepts.
+    """
+    def __init__(self, kernel, n_features=1000, features='rff', alpha=1e-4, normalize_y=True,
+                 optimizer='fmin_l_bfgs_b', n_restarts_optimizer=0, n_subset=500, chunk_size=4096,
+                 random_state=None):
+        self.kernel = kernel
+        self.n_features = n_features
+        self.features = features
+        self.alpha = alpha
+        self.normalize_y = normalize_y
+        self.optimizer = optimizer
+        self.n_restarts_optimizer = n_restarts_optimizer
+        self.n_subset = n_subset
+        self.chunk_size = chunk_size
+        self.random_state = random_state
+
+    def fit(self, X, y):
+        """
+        Fit the feature-space posterior on all training windows.
+
+        Args:
+        - X: Training windows, shape (n_samples, window_size); any array supporting row slicing
+        - y: Next-note targets, shape (n_samples,)
+
+        Returns:
+        - self
+        """
+        rng = check_random_state(self.random_state)
+        y, self._y_train_mean, self._y_train_std = normalize_targets(y, self.normalize_y)
+        self.kernel_ = fit_subset_kernel(self.kernel, X, y, self.n_subset, self.alpha, self.optimizer,
+                                         self.n_restarts_optimizer, rng)
+        self.amplitude_, length_scale, self.noise_level_ = rbf_parameters(self.kernel_)
+        self._fit_feature_map(X, np.asarray(length_scale, dtype=np.float64), rng)
+
+        # Stream the chunks into the running sums Phi^T Phi and Phi^T y
+        n_features = self.n_features_
+        A = np.zeros((n_features, n_features))
+        b = np.zeros(n_features)
+        for start in range(0, len(X), self.chunk_size):
+            Phi = self.transform(X[start:start + self.chunk_size])
+            A += Phi.T @ Phi
+            b += Phi.T @ y[start:start + self.chunk_size]
+
+        # Posterior over the feature weights: N(A^-1 Phi^T y, noise * A^-1) with A = Phi^T Phi + noise * I
+        self.noise_ = self.alpha + self.noise_level_
+        A[np.diag_indices_from(A)] += self.noise_
+        self.L_A_ = cholesky(A, lower=True)
+        self.coef_ = cho_solve((self.L_A_, True), b)
+        self.n_train_ = len(X)
+        return self
+
+    def _fit_feature_map(self, X, length_scale, rng):
+        """Draw the random frequencies, or pick the landmarks and whiten them"""
+        window_size = X.shape[1]
+        if self.features == 'rff':
+            self.n_features_ = self.n_features
+            self.frequencies_ = rng.standard_normal((window_size, self.n_features_)) / np.reshape(length_scale, (-1, 1))
+            self.phases_ = rng.uniform(0.0, 2.0 * np.pi, self.n_features_)
+        elif self.features == 'nystrom':
+            landmarks = np.sort(rng.choice(len(X), size=min(self.n_features, len(X)), replace=False))
+            self.landmarks_ = np.asarray(X[landmarks], dtype=np.float64)
+            # K_ZZ^-1/2 from the eigendecomposition, dropping directions the landmarks do not span;
+            # with an explicit second argument a WhiteKernel term contributes nothing
+            eigenvalues, eigenvectors = eigh(self.kernel_(self.landmarks_, self.landmarks_))
+            keep = eigenvalues > 1e-10 * eigenvalues.max()
+            self.normalization_ = eigenvectors[:, keep] / np.sqrt(eigenvalues[keep])
+            self.n_features_ = int(keep.sum())
+        else:
+            raise ValueError(f"Unknown feature map: {self.features}")
+
+    def transform(self, X):
+        """Feature map phi(X), shape (n_windows, n_features_)"""
+        X = np.asarray(X, dtype=np.float64)
+        if self.features == 'rff':
+            projection = X @ self.frequencies_
+            projection += self.phases_
+            return np.sqrt(2.0 * self.amplitude_ / self.n_features_) * np.cos(projection, out=projection)
+        return self.kernel_(X, self.landmarks_) @ self.normalization_
+
+    def predict(self, X, return_std=False):
+        """
+        Predict the next note for each query window.
+
+        Args:
+        - X: Query windows, shape (n_queries, window_size)
+        - return_std: Whether to also return the predictive standard deviation
+
+        Returns:
+        - y_mean, and y_std if return_std is True
+        """
+        Phi = self.transform(np.atleast_2d(X))
+        y_mean = self._y_train_std * (Phi @ self.coef_) + self._y_train_mean
+        if not return_std:
+            return y_mean
+
+        # var = noise * phi^T A^-1 phi, plus the white noise of the kernel as in GaussianProcessRegressor
+        V = solve_triangular(self.L_A_, Phi.T, lower=True, check_finite=False)
+        y_var = self.noise_ * np.einsum('ij,ij->j', V, V) + self.noise_level_
+        if self.features == 'nystrom':
+            # Nystrom features underestimate the prior variance; add back k(x, x) - phi^T phi
+            y_var += np.maximum(self.amplitude_ - np.einsum('ij,ij->i', Phi, Phi), 0.0)
+        return y_mean, np.sqrt(y_var) * self._y_train_std
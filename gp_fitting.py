@@ -0,0 +1,57 @@
+import numpy as np
+from sklearn.gaussian_process import GaussianProcessRegressor
+
+
+def normalize_targets(y, normalize_y=True):
+    """
+    Normalize the targets in the same way as GaussianProcessRegressor(normalize_y=True).
+
+    Args:
+    - y: Next-note targets, shape (n_samples,)
+    - normalize_y: Whether to normalize; otherwise the mean is 0 and the std 1
+
+    Returns:
+    - (normalized y, mean, std), with the std replaced by 1 for constant targets
+    """
+    y = np.asarray(y, dtype=np.float64)
+    if not normalize_y:
+        return y, 0.0, 1.0
+    y_mean = np.mean(y)
+    y_std = np.std(y)
+    y_std = y_std if y_std > 0 else 1.0
+    return (y - y_mean) / y_std, y_mean, y_std
+
+
+def random_subset(n_samples, n_subset, rng):
+    """Sorted indices of min(n_subset, n_samples) windows drawn without replacement"""
+    return np.sort(rng.choice(n_samples, size=min(n_subset, n_samples), replace=False))
+
+
+def fit_subset_kernel(kernel, X, y, n_subset, alpha, optimizer, n_restarts_optimizer, rng):
+    """
+    Learn the kernel hyperparameters with an exact GP on a random subset, O(n_subset^3).
+
+    Args:
+    - kernel: Kernel to optimize
+    - X: Training windows, shape (n_samples, window_size); any array supporting row indexing
+    - y: Normalized targets, shape (n_samples,)
+    - n_subset: Number of windows sampled for the optimization
+    - alpha, optimizer, n_restarts_optimizer: As in GaussianProcessRegressor
+    - rng: RandomState for the subset and the optimizer restarts
+
+    Returns:
+    - The optimized kernel, or the kernel itself if optimizer is None
+    """
+    if optimizer is None:
+        return kernel
+    subset = random_subset(len(X), n_subset, rng)
+    gp = GaussianProcessRegressor(
+        kernel=kernel,
+        alpha=alpha,
+        optimizer=optimizer,
+        n_restarts_optimizer=n_restarts_optimizer,
+        normalize_y=False,
+        random_state=rng,
+    )
+    gp.fit(np.asarray(X[subset], dtype=np.float64), y[subset])
+    return gp.kernel_
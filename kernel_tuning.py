@@ -0,0 +1,134 @@
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import os
+import numpy as np
+from sklearn.gaussian_process import GaussianProcessRegressor
+from sklearn.gaussian_process.kernels import RBF, WhiteKernel
+from sklearn.utils import check_random_state
+from gp_fitting import normalize_targets, random_subset
+from windowing import LazyWindows
+
+
+def rbf_kernel():
+    """RBF over the windows, with the starting length scale and bounds every untuned model uses"""
+    return RBF(length_scale=0.2, length_scale_bounds=(1e-4, 1e2))
+
+
+def default_kernel():
+    """RBF over the windows plus a learned noise level, starting from the length scale used so far"""
+    return rbf_kernel() + WhiteKernel(noise_level=1e-5, noise_level_bounds=(1e-10, 1e-1))
+
+
+def dataset_hash(X, y, chunk_size=65536):
+    """
+    Content hash of a training set of windows and targets.
+
+    LazyWindows are hashed through their note buffer and window starts, so the windows are never
+    materialized; dense arrays are hashed in row chunks.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(X, LazyWindows):
+        digest.update(np.ascontiguousarray(X.buffer).tobytes())
+        digest.update(np.ascontiguousarray(X.starts, dtype=np.int64).tobytes())
+        digest.update(str(X.window_size).encode("utf-8"))
+    else:
+        for start in range(0, len(X), chunk_size):
+            digest.update(np.ascontiguousarray(X[start:start + chunk_size], dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(y, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def _init_worker(X, y, kernel, alpha):
+    global _worker_data
+    _worker_data = (X, y, kernel, alpha)
+
+
+def _optimize_restart(theta):
+    """One L-BFGS-B run from the log-hyperparameters theta; returns (log marginal likelihood, optimized theta)"""
+    X, y, kernel, alpha = _worker_data
+    gp = GaussianProcessRegressor(
+        kernel=kernel.clone_with_theta(theta),
+        alpha=alpha,
+        optimizer='fmin_l_bfgs_b',
+        n_restarts_optimizer=0,
+        normalize_y=False,
+    )
+    gp.fit(X, y)
+    return gp.log_marginal_likelihood_value_, gp.kernel_.theta
+
+
+def tune_kernel(X, y, kernel=None, n_subset=2000, n_restarts=5, alpha=1e-9, workers=1,
+                cache_path=None, random_state=42):
+    """
+    Optimize the kernel hyperparameters once on a representative subsample.
+
+    The first L-BFGS-B run starts from the given kernel and the n_restarts others from log-uniform
+    draws within the hyperparameter bounds, as GaussianProcessRegressor does, but the runs are
+    spread over a process pool. The targets are normalized once over all of y, as the backends
+    do, and alpha should be the jitter of the backend the kernel is tuned for, so the optimized
+    noise level is consistent with how that backend fits. The result is cached in a JSON file
+    keyed by the dataset hash and the tuning settings, alpha included, so later training runs on
+    the same data skip the optimization and fit with optimizer=None.
+
+    Args:
+    - X: Training windows, shape (n_samples, window_size); any array supporting row indexing
+    - y: Next-note targets, shape (n_samples,)
+    - kernel: Kernel to tune (default: RBF + WhiteKernel)
+    - n_subset: Number of windows sampled for the optimization
+    - n_restarts: Number of extra random starts
+    - alpha: Jitter added to the kernel diagonal by the target backend, as in GaussianProcessRegressor
+    - workers: Number of worker processes; 1 runs the restarts in this process
+    - cache_path: JSON cache file, or None to always optimize
+    - random_state: Seed for the subsample and the random starts
+
+    Returns:
+    - The optimized kernel
+    """
+    kernel = kernel if kernel is not None else default_kernel()
+    key = None
+    cache = {}
+    if cache_path is not None:
+        settings = f"{kernel!r}|{n_subset}|{n_restarts}|{alpha}|{random_state}|global-y"
+        key = f"{dataset_hash(X, y)}-{hashlib.blake2b(settings.encode('utf-8'), digest_size=8).hexdigest()}"
+        if os.path.exists(cache_path):
+            # A truncated or corrupt cache is treated as a miss and rewritten after tuning
+            try:
+                with open(cache_path) as f:
+                    cache = json.load(f)
+            except json.JSONDecodeError as error:
+                print(f"Ignoring unreadable kernel cache {cache_path}: {error}")
+        if key in cache:
+            print(f"Using cached kernel {cache[key]['kernel']} from {cache_path}")
+            return kernel.clone_with_theta(np.array(cache[key]['theta']))
+
+    rng = check_random_state(random_state)
+    subset = random_subset(len(X), n_subset, rng)
+    X_subset = np.asarray(X[subset], dtype=np.float64)
+    # Normalize with the statistics of all targets, not of the subset, as the backends do
+    y_subset = normalize_targets(y)[0][subset]
+    bounds = kernel.bounds
+    starts = [kernel.theta] + [rng.uniform(bounds[:, 0], bounds[:, 1]) for _ in range(n_restarts)]
+
+    print(f"Tuning {kernel} on {len(subset)} windows with {len(starts)} starts")
+    if workers > 1 and len(starts) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(X_subset, y_subset, kernel, alpha)) as executor:
+            results = list(executor.map(_optimize_restart, starts))
+    else:
+        _init_worker(X_subset, y_subset, kernel, alpha)
+        results = [_optimize_restart(theta) for theta in starts]
+    log_marginal_likelihood, theta = max(results, key=lambda result: result[0])
+    tuned = kernel.clone_with_theta(theta)
+    print(f"Tuned kernel: {tuned} (log marginal likelihood {log_marginal_likelihood:.3f})")
+
+    if key is not None:
+        cache[key] = {'kernel': repr(tuned), 'theta': theta.tolist(),
+                      'log_marginal_likelihood': float(log_marginal_likelihood), 'n_subset': len(subset)}
+        # Write to a temporary file first so an interrupted run never leaves a truncated cache
+        os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(cache, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, cache_path)
+    return tuned
@@ -0,0 +1,146 @@
+import os
+import pickle
+import numpy as np
+from windowing import concat_sequences, take_sequences
+
+
+class MelodyCorpus:
+    """
+    Compact ragged container for a set of melodies.
+
+    All notes live in one contiguous typed array (uint8 is enough for MIDI pitches) and melody i is
+    pitches[offsets[i]:offsets[i + 1]]. Names and any per-melody metadata are parallel arrays.
+    Indexing with an int returns a view of one melody, a slice returns a corpus that shares the
+    note buffer, and a boolean mask or index array returns a filtered copy, so e.g.
+    corpus[corpus.lengths >= 40] replaces a per-row filter over Python lists. save() / load() use
+    plain .npy files that can be memory-mapped, with no pickling.
+    """
+    def __init__(self, pitches, offsets, names=None, metadata=None):
+        self.pitches = pitches
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        n_melodies = len(self.offsets) - 1
+        self.names = np.asarray(names, dtype=str) if names is not None else np.full(n_melodies, '', dtype=str)
+        self.metadata = {key: np.asarray(values) for key, values in (metadata or {}).items()}
+        if len(self.names) != n_melodies or any(len(values) != n_melodies for values in self.metadata.values()):
+            raise ValueError("names and metadata need one entry per melody")
+
+    @classmethod
+    def from_sequences(cls, sequences, names=None, dtype=np.uint8, metadata=None):
+        """Build a corpus from a list of note sequences (lists or arrays)"""
+        pitches, offsets = concat_sequences(sequences, dtype=dtype)
+        return cls(pitches, offsets, names, metadata)
+
+    @classmethod
+    def from_pickle(cls, pickle_file, dtype=np.uint8):
+        """Read a legacy melodies.pkl (a pickled MelodyStore of Melody objects)"""
+        with open(pickle_file, 'rb') as file:
+            melody_store = _LegacyUnpickler(file).load()
+        return cls.from_sequences([melody.pitch_sequence for melody in melody_store.melodies],
+                                  names=[melody.name for melody in melody_store.melodies], dtype=dtype)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __repr__(self):
+        return f"MelodyCorpus(n_melodies={len(self)}, n_notes={self.n_notes}, dtype={self.pitches.dtype})"
+
+    @property
+    def n_notes(self):
+        return int(self.offsets[-1] - self.offsets[0])
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            if key < 0:
+                key += len(self)
+            return self.pitches[self.offsets[key]:self.offsets[key + 1]]
+
+        names = self.names[key]
+        metadata = {name: values[key] for name, values in self.metadata.items()}
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1:
+                # Contiguous range: share the note buffer and rebase the offsets
+                offsets = self.offsets[start:max(stop, start) + 1]
+                return MelodyCorpus(self.pitches[offsets[0]:offsets[-1]], offsets - offsets[0], names, metadata)
+            key = np.arange(start, stop, step)
+
+        rows = np.asarray(key)
+        if rows.dtype == bool:
+            rows = np.flatnonzero(rows)
+        pitches, offsets = take_sequences(self.pitches, self.offsets - self.offsets[0], rows)
+        return MelodyCorpus(pitches, offsets, names, metadata)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.names[i], self[i]
+
+    def filter(self, mask):
+        """Keep the melodies where mask is True"""
+        return self[np.asarray(mask, dtype=bool)]
+
+    def compress_notes(self, keep):
+        """Drop individual notes (e.g. rests) where the per-note mask `keep` is False"""
+        keep = np.asarray(keep, dtype=bool)
+        rows = np.repeat(np.arange(len(self)), self.lengths)
+        offsets = np.zeros(len(self) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows[keep], minlength=len(self)), out=offsets[1:])
+        pitches = self.pitches[self.offsets[0]:self.offsets[-1]][keep]
+        return MelodyCorpus(pitches, offsets, self.names, self.metadata)
+
+    def map_notes(self, mapping, dtype=None):
+        """Map every note through a dict in one table lookup; notes missing from the dict are kept"""
+        pitches = np.asarray(self.pitches[self.offsets[0]:self.offsets[-1]])
+        size = max(int(pitches.max(initial=0)), max(mapping, default=0)) + 1
+        table = np.arange(size, dtype=np.int64)
+        table[list(mapping)] = list(mapping.values())
+        mapped = table[pitches].astype(dtype or self.pitches.dtype)
+        return MelodyCorpus(mapped, self.offsets - self.offsets[0], self.names, self.metadata)
+
+    def to_lists(self):
+        """The melodies as Python lists, e.g. for writing CSV cells"""
+        values = self.pitches[self.offsets[0]:self.offsets[-1]].tolist()
+        bounds = (self.offsets - self.offsets[0]).tolist()
+        return [values[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+    def save(self, directory):
+        """Save as .npy files in a directory; no pickling, so load() can memory-map them"""
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, 'pitches.npy'), np.asarray(self.pitches[self.offsets[0]:self.offsets[-1]]))
+        np.save(os.path.join(directory, 'offsets.npy'), self.offsets - self.offsets[0])
+        np.save(os.path.join(directory, 'names.npy'), self.names)
+        for name, values in self.metadata.items():
+            np.save(os.path.join(directory, f'meta_{name}.npy'), values)
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        """Load a corpus saved with save(), memory-mapping the note buffer by default"""
+        pitches = np.load(os.path.join(directory, 'pitches.npy'), mmap_mode=mmap_mode)
+        offsets = np.load(os.path.join(directory, 'offsets.npy'))
+        names = np.load(os.path.join(directory, 'names.npy'))
+        metadata = {filename[len('meta_'):-len('.npy')]: np.load(os.path.join(directory, filename), mmap_mode=mmap_mode)
+                    for filename in sorted(os.listdir(directory))
+                    if filename.startswith('meta_') and filename.endswith('.npy')}
+        return cls(pitches, offsets, names, metadata)
+
+
+class _LegacyMelody:
+    pass
+
+
+class _LegacyUnpickler(pickle.Unpickler):
+    """Unpickle the Melody / MelodyStore objects the pop-file-gen scripts used to pickle from __main__"""
+    def find_class(self, module, name):
+        if name in ('Melody', 'MelodyStore'):
+            return _LegacyMelody
+        return super().find_class(module, name)
+
+
+def read_corpus(path, mmap_mode='r'):
+    """Open a corpus directory written by MelodyCorpus.save, or a legacy melodies .pkl file"""
+    if path.endswith('.pkl'):
+        return MelodyCorpus.from_pickle(path)
+    return MelodyCorpus.load(path, mmap_mode=mmap_mode)
@@ -0,0 +1,164 @@
+import numpy as np
+
+
+class PitchQuantizer:
+    """
+    Nearest-key lookup table from continuous values (e.g. normalized pitches) to discrete values
+    (e.g. MIDI pitches).
+
+    The keys are kept sorted, so a whole array is quantized with one np.searchsorted call,
+    O(log n) per value, instead of scanning every key for every value.
+    """
+    def __init__(self, keys, values=None):
+        keys = np.asarray(keys, dtype=np.float64)
+        values = keys if values is None else np.asarray(values)
+        if keys.shape != values.shape or keys.ndim != 1 or len(keys) == 0:
+            raise ValueError("keys and values must be non-empty 1D arrays of the same length")
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.values = values[order]
+
+    @classmethod
+    def from_pairs(cls, keys, values):
+        """
+        Build a quantizer from (key, value) pairs that may repeat keys.
+
+        As with filling a dict pair by pair, the last value seen for a key wins.
+        """
+        keys = np.asarray(keys, dtype=np.float64)
+        values = np.asarray(values)
+        # np.unique keeps the first occurrence, so search the reversed pairs to keep the last
+        unique_keys, index = np.unique(keys[::-1], return_index=True)
+        return cls(unique_keys, values[::-1][index])
+
+    def nearest_index(self, x):
+        """Index of the nearest key for every value of x (the lower key on exact ties)"""
+        x = np.asarray(x, dtype=np.float64)
+        right = np.clip(np.searchsorted(self.keys, x), 1, len(self.keys) - 1) if len(self.keys) > 1 \
+            else np.zeros(x.shape, dtype=np.int64)
+        left = np.maximum(right - 1, 0)
+        use_right = np.abs(self.keys[right] - x) < np.abs(x - self.keys[left])
+        return np.where(use_right, right, left)
+
+    def quantize(self, x):
+        """Map every value of x to the value of its nearest key"""
+        return self.values[self.nearest_index(x)]
+
+    __call__ = quantize
+
+
+class PitchNormalizer:
+    """
+    Min-max pitch scaling, normalized = (pitch - min_pitch) / (max_pitch - min_pitch), with stored parameters.
+
+    forward / inverse work on arrays of any shape, and on ragged batches given as a flat buffer plus
+    offsets, in which case min_pitch and max_pitch may also hold one value per sequence. The
+    parameters serialize to a plain dict, so the scale a model was trained with is saved with it.
+    """
+    def __init__(self, min_pitch=55, max_pitch=84):
+        self.min_pitch = min_pitch
+        self.max_pitch = max_pitch
+
+    def __repr__(self):
+        return f"PitchNormalizer(min_pitch={self.min_pitch}, max_pitch={self.max_pitch})"
+
+    def _params(self, offsets):
+        """Scale parameters, repeated per element when they are given per sequence of a ragged batch"""
+        min_pitch = np.asarray(self.min_pitch, dtype=np.float64)
+        max_pitch = np.asarray(self.max_pitch, dtype=np.float64)
+        if offsets is not None and min_pitch.ndim:
+            lengths = np.diff(offsets)
+            min_pitch, max_pitch = np.repeat(min_pitch, lengths), np.repeat(max_pitch, lengths)
+        return min_pitch, max_pitch - min_pitch
+
+    def fit(self, pitches):
+        """Take min_pitch / max_pitch from the data (an array, or a list of sequences)"""
+        if not isinstance(pitches, np.ndarray):
+            pitches = np.concatenate([np.asarray(sequence, dtype=np.float64).ravel() for sequence in pitches])
+        self.min_pitch, self.max_pitch = pitches.min().item(), pitches.max().item()
+        return self
+
+    @classmethod
+    def from_anchors(cls, pitches, normalized, offsets, normalized_offsets=None):
+        """
+        Per-sequence scales that map each sequence's normalized range onto its pitch range.
+
+        Every sequence must be non-empty. For sequences whose normalized values are all equal,
+        every value maps to the middle of the pitch range.
+
+        Args:
+        - pitches, offsets: Flat pitch buffer and its sequence boundaries
+        - normalized, normalized_offsets: Flat normalized buffer and its boundaries (default: offsets)
+        """
+        pitches = np.asarray(pitches, dtype=np.float64)
+        normalized = np.asarray(normalized, dtype=np.float64)
+        normalized_offsets = offsets if normalized_offsets is None else normalized_offsets
+        if np.any(np.diff(offsets) == 0) or np.any(np.diff(normalized_offsets) == 0):
+            raise ValueError("Every sequence needs at least one pitch and one normalized value")
+        min_pitch = np.minimum.reduceat(pitches, offsets[:-1])
+        max_pitch = np.maximum.reduceat(pitches, offsets[:-1])
+        min_norm = np.minimum.reduceat(normalized, normalized_offsets[:-1])
+        max_norm = np.maximum.reduceat(normalized, normalized_offsets[:-1])
+        norm_range = max_norm - min_norm
+        flat = norm_range == 0
+        scale = np.where(flat, 0.0, (max_pitch - min_pitch) / np.where(flat, 1.0, norm_range))
+        low = np.where(flat, (min_pitch + max_pitch) / 2.0, min_pitch - min_norm * scale)
+        return cls(low, low + scale)
+
+    def forward(self, pitches, offsets=None):
+        """Normalize pitches (any shape, or a flat ragged buffer with its offsets)"""
+        min_pitch, range_pitch = self._params(offsets)
+        return (np.asarray(pitches, dtype=np.float64) - min_pitch) / range_pitch
+
+    def inverse(self, normalized, offsets=None, rounding='round'):
+        """
+        Map normalized values back to pitches.
+
+        Args:
+        - normalized: Normalized values (any shape, or a flat ragged buffer with its offsets)
+        - offsets: Sequence boundaries when the scale parameters are per sequence
+        - rounding: 'round' to the nearest integer pitch, 'truncate' toward zero like int(), or None for floats
+
+        Returns:
+        - int64 pitches, or float64 when rounding is None
+        """
+        min_pitch, range_pitch = self._params(offsets)
+        pitches = np.asarray(normalized, dtype=np.float64) * range_pitch + min_pitch
+        if rounding == 'round':
+            return np.rint(pitches).astype(np.int64)
+        if rounding == 'truncate':
+            return np.trunc(pitches).astype(np.int64)
+        if rounding is None:
+            return pitches
+        raise ValueError(f"Unknown rounding: {rounding}")
+
+    def forward_sequences(self, sequences):
+        """Normalize a list of pitch sequences in one vectorized pass; returns a list of lists"""
+        return _map_sequences(self.forward, sequences)
+
+    def inverse_sequences(self, sequences, rounding='round'):
+        """Map a list of normalized sequences back to pitches in one vectorized pass; returns a list of lists"""
+        return _map_sequences(lambda buffer: self.inverse(buffer, rounding=rounding), sequences)
+
+    def to_dict(self):
+        return {'min_pitch': np.asarray(self.min_pitch).tolist(), 'max_pitch': np.asarray(self.max_pitch).tolist()}
+
+    @classmethod
+    def from_dict(cls, params):
+        return cls(params['min_pitch'], params['max_pitch'])
+
+
+def _map_sequences(transform, sequences):
+    """Apply an elementwise transform to ragged sequences through one flat buffer"""
+    lengths = [len(sequence) for sequence in sequences]
+    if not sum(lengths):
+        return [[] for _ in sequences]
+    values = transform(np.concatenate([np.asarray(sequence, dtype=np.float64) for sequence in sequences if len(sequence)]))
+    values = values.tolist()
+    bounds = np.cumsum([0] + lengths).tolist()
+    return [values[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+# Scale of the chant training data, and the 88-key piano range used for the pop test sets
+CHANT_SCALE = PitchNormalizer(55, 84)
+PIANO_SCALE = PitchNormalizer(21, 108)
@@ -1,6 +1,15 @@
+import hashlib
+import json
+import os
+import zlib
+import numpy as np
 import pandas as pd
 import ast
 from sklearn.model_selection import train_test_split
+from dataset_io import dataset_from_dataframe, load_dataset, save_dataset
+from pitch_scale import CHANT_SCALE, PIANO_SCALE, PitchNormalizer
+from volpiano import NOTE_MAPPING, get_tokenizer
+from windowing import lazy_windows, take_sequences
 
 def melody_to_pitch_sequence(melody, note_mapping):
     """
@@ -13,34 +22,7 @@ def melody_to_pitch_sequence(melody, note_mapping):
     Returns:
         pitch_sequence (list): list of MIDI pitch values (integers)
     """
-    if '6------6' in melody:
-        return 'skip'
-
-    pitch_sequence = []
-    i = 0
-    while i < len(melody):
-        if melody[i:i+3] == '---':
-            pitch_sequence.append(None)
-            i += 3
-        elif melody[i:i+2] == '--': 
-            pitch_sequence.append(None)
-            i += 2
-        elif melody[i] == '-':
-            pitch_sequence.append(None)
-            i += 1
-        elif melody[i].lower() in note_mapping:
-            note = note_mapping[melody[i].lower()]
-            if isinstance(note, int):
-                pitch_sequence.append(note)
-            i += 1
-        elif melody[i:i+4] == '---4':
-            break
-        else:
-            i += 1
-
-    pitch_sequence = [pitch for pitch in pitch_sequence if pitch is not None]
-
-    return pitch_sequence
+    return get_tokenizer(note_mapping).parse(melody)
 
 def normalize_pitch_sequence(pitch_sequence):
     """
@@ -52,12 +34,7 @@ def normalize_pitch_sequence(pitch_sequence):
     Returns:
         normalized_sequence (list): list of normalized pitch values (floats)
     """
-    min_pitch = 55
-    max_pitch = 84
-    range_pitch = max_pitch - min_pitch
-
-    normalized_sequence = [(pitch - min_pitch) / range_pitch for pitch in pitch_sequence]
-    return normalized_sequence
+    return CHANT_SCALE.forward(pitch_sequence).tolist()
 
 def clean_dataset(df):
     """
@@ -120,66 +97,212 @@ def reverse_normalization(normalized_sequence):
     Returns:
         pitch_sequence (list): list of original pitch values (integers)
     """
-    min_pitch = 21
-    max_pitch = 109
-    range_pitch = max_pitch - min_pitch
-
-    pitch_sequence = [int(normalized * range_pitch + min_pitch) for normalized in normalized_sequence]
-    return pitch_sequence
+    return PIANO_SCALE.inverse(normalized_sequence).tolist()
     
-if __name__ == "__main__":
-    # note mapping
-    note_mapping = {
-        '9': 55,  # G3
-        'a': 57,  # A3
-        'b': 59,  # B3
-        'c': 60,  # C4
-        'd': 62,  # D4
-        'e': 64,  # E4
-        'f': 65,  # F4
-        'g': 67,  # G4
-        'h': 69,  # A4
-        'j': 71,  # B4
-        'k': 72,  # C5
-        'l': 74,  # D5
-        'm': 76,  # E5
-        'n': 77,  # F5
-        'o': 79,  # G5
-        'p': 81,  # A5
-        'q': 83,  # B5
-        'r': 84,  # C6
-        's': 86,  # D6
-        '---4': 'end',
-        '---3': 'end',
-        '1--': 'start',
-        '---': 'word_pause',
-        '--': 'syllable_pause',
-        '-': 'neume_pause', 
-        '7': 'line_break',
-        '777': 'page_break',
-    }
-    
-    df_main = pd.read_csv('dataset/dataset_all.csv')
+# Parameters of every pipeline stage; each one is part of the cache key of the stages that use it
+PIPELINE_PARAMS = {
+    'shard_size': 2048,
+    'min_length': 40,
+    'min_pitch': CHANT_SCALE.min_pitch,
+    'max_pitch': CHANT_SCALE.max_pitch,
+    'test_size': 0.3,
+    'split_seed': 522117,
+    'window_size': 32,
+}
+
+def content_key(*parts):
+    """
+    Hash stage inputs and parameters into a cache key.
+
+    Inputs:
+        parts: strings, numbers, dicts, lists or numpy arrays
 
-    # Process each melody and add the pitch sequence to a new column
-    df_main['pitch_sequence'] = df_main['melody'].apply(lambda x: melody_to_pitch_sequence(x, note_mapping))
+    Returns:
+        key (str): hex digest identifying the inputs
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            digest.update(f"{part.dtype}{part.shape}".encode())
+            digest.update(np.ascontiguousarray(part).tobytes())
+        elif isinstance(part, dict):
+            digest.update(repr(sorted(part.items())).encode())
+        elif isinstance(part, (list, tuple)) and part and isinstance(part[0], str):
+            # Length-prefix every string so the boundaries between them are part of the hash
+            for item in part:
+                encoded = item.encode('utf-8')
+                digest.update(len(encoded).to_bytes(8, 'little'))
+                digest.update(encoded)
+        else:
+            digest.update(repr(part).encode())
+        digest.update(b'\x1f')
+    return digest.hexdigest()[:24]
 
-    # Clean the dataset by removing rows with 'skip' in the melody column and reindexing
-    df_cleaned = clean_dataset(df_main)
-    
-    # Normalize the pitch sequences
-    df_cleaned['normalized_pitch_sequence'] = df_main['pitch_sequence'].apply(lambda x: normalize_pitch_sequence(x) if isinstance(x, list) else x)
-    
-    df_cleaned.to_csv('dataset/dataset_all.csv', index=False)
-    
-    # Split the dataset into training and testing sets
-    df_train, df_test = train_test_split(df_cleaned, test_size=0.3, random_state=522117)
+def cached_stage(cache_dir, stage, key, compute):
+    """
+    Return the cached output of a stage, computing and storing it if it is missing.
 
-    # Process the test DataFrame by adding new columns and split the normalized_pitch_sequence to input_pitch and option_1
-    df_test = process_test_dataframe(df_test)
+    Inputs:
+        cache_dir (str): directory holding the stage outputs
+        stage (str): stage name, used in the file name
+        key (str): content key of the stage inputs and parameters
+        compute (callable): returns a dict of numpy arrays
 
-    df_train.to_csv('dataset/dataset_train.csv', index=False) 
-    df_test.to_csv('dataset/dataset_test.csv', index=False)
+    Returns:
+        dict: stage output arrays
+    """
+    path = os.path.join(cache_dir, f"{stage}-{key}.npz")
+    if os.path.exists(path):
+        with np.load(path, allow_pickle=False) as archive:
+            return {name: archive[name] for name in archive.files}
+
+    arrays = compute()
+    # Write to a temporary file first so an interrupted run never leaves a truncated cache entry
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+    return arrays
+
+def shard_bounds(melodies, shard_size):
+    """
+    Split the rows into content-defined shards.
+
+    A shard ends after every row whose melody hash is divisible by shard_size, so inserting or
+    removing a melody only changes the shard that contains it instead of shifting every later shard.
+
+    Returns:
+        bounds (list): (start, end) row ranges
+    """
+    hashes = np.fromiter((zlib.crc32(str(melody).encode('utf-8')) for melody in melodies), dtype=np.uint64,
+                         count=len(melodies))
+    ends = np.flatnonzero(hashes % shard_size == 0) + 1
+    ends = np.union1d(ends, [len(melodies)]).astype(np.int64)
+    starts = np.concatenate(([0], ends[:-1]))
+    return [(start, end) for start, end in zip(starts, ends) if end > start]
+
+def run_pipeline(source_path, output_dir='dataset', cache_dir='dataset/cache', note_mapping=NOTE_MAPPING,
+                 **params):
+    """
+    Staged, cached preprocessing: parse -> clean -> normalize -> split -> window.
+
+    Every stage output is cached on disk under a content hash of its inputs and parameters, and the
+    parse/clean/normalize stages run per shard, so a rebuild only redoes the shards and stages
+    whose inputs or parameters changed.
+
+    Inputs:
+        source_path (str): CSV with a 'melody' column of Volpiano strings, or a .npz dataset with
+            'melody' strings (e.g. from relevant_csv/ingest_volpiano.py)
+        output_dir (str): directory for the cleaned, train and test datasets
+        cache_dir (str): directory for the cached stage outputs
+        note_mapping (dict): mapping of note characters to MIDI note numbers
+        params: overrides for PIPELINE_PARAMS
+
+    Returns:
+        str: directory with the memory-mappable training windows
+    """
+    params = {**PIPELINE_PARAMS, **params}
+    os.makedirs(cache_dir, exist_ok=True)
+    tokenizer = get_tokenizer(note_mapping)
+
+    if source_path.endswith('.npz'):
+        df_main = pd.DataFrame({'melody': load_dataset(source_path)['melody'].astype(object)})
+    else:
+        df_main = pd.read_csv(source_path)
+    melodies = df_main['melody'].tolist()
+
+    rows, pitch_parts, normalized_parts, length_parts, shard_keys = [], [], [], [], []
+    for start, end in shard_bounds(melodies, params['shard_size']):
+        shard = [melody if isinstance(melody, str) else '' for melody in melodies[start:end]]
+        missing = np.array([not isinstance(melody, str) for melody in melodies[start:end]])
+
+        # Stage 1: parse Volpiano into MIDI pitches
+        parse_key = content_key('parse', note_mapping, shard, missing)
+        def parse():
+            pitches, offsets, skipped = tokenizer.parse_chunk(melodies[start:end])
+            return {'pitches': pitches, 'offsets': offsets, 'skipped': skipped}
+        parsed = cached_stage(cache_dir, 'parse', parse_key, parse)
+
+        # Stage 2: clean, dropping incomplete melodies and melodies shorter than min_length
+        clean_key = content_key('clean', parse_key, params['min_length'])
+        def clean():
+            lengths = np.diff(parsed['offsets'])
+            keep = np.flatnonzero(~parsed['skipped'] & (lengths >= params['min_length']))
+            pitches, offsets = take_sequences(parsed['pitches'], parsed['offsets'], keep)
+            return {'rows': keep, 'pitches': pitches, 'offsets': offsets}
+        cleaned = cached_stage(cache_dir, 'clean', clean_key, clean)
+
+        # Stage 3: normalize the pitches to [0, 1]
+        normalize_key = content_key('normalize', clean_key, params['min_pitch'], params['max_pitch'])
+        def normalize():
+            return {'normalized': PitchNormalizer(params['min_pitch'], params['max_pitch']).forward(cleaned['pitches'])}
+        normalized = cached_stage(cache_dir, 'normalize', normalize_key, normalize)
+
+        rows.append(cleaned['rows'] + start)
+        pitch_parts.append(cleaned['pitches'])
+        normalized_parts.append(normalized['normalized'])
+        length_parts.append(np.diff(cleaned['offsets']))
+        shard_keys.append(normalize_key)
+
+    rows = np.concatenate(rows)
+    pitches = np.concatenate(pitch_parts)
+    normalized = np.concatenate(normalized_parts)
+    offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(np.concatenate(length_parts), out=offsets[1:])
+
+    # Stage 4: split the cleaned melodies into training and testing sets
+    split_key = content_key('split', shard_keys, params['test_size'], params['split_seed'])
+    def split():
+        train_rows, test_rows = train_test_split(np.arange(len(rows)), test_size=params['test_size'],
+                                                 random_state=params['split_seed'])
+        return {'train': train_rows, 'test': test_rows}
+    split_rows = cached_stage(cache_dir, 'split', split_key, split)
+
+    # Stage 5: training windows, stored as a flat buffer plus window starts that can be memory-mapped
+    window_key = content_key('window', split_key, params['window_size'])
+    window_dir = os.path.join(cache_dir, f"window-{window_key}")
+    if not os.path.exists(os.path.join(window_dir, 'window_size.npy')):
+        train_buffer, train_offsets = take_sequences(normalized, offsets, split_rows['train'])
+        windows, _ = lazy_windows(np.round(train_buffer, 4), train_offsets, params['window_size'])
+        windows.save(window_dir)
+
+    # Write the datasets, unless the outputs of this exact build are already in place
+    manifest_path = os.path.join(cache_dir, 'outputs.json')
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    output_key = content_key('output', split_key, pd.util.hash_pandas_object(df_main, index=False).to_numpy())
+    output_names = ['dataset_cleaned.csv', 'dataset_train.csv', 'dataset_test.csv', 'dataset_train.npz', 'dataset_test.npz']
+    outputs_exist = all(os.path.exists(os.path.join(output_dir, name)) for name in output_names)
+    if outputs_exist and manifest.get(output_dir) == output_key:
+        print(f"Datasets in {output_dir} are up to date")
+        return window_dir
+
+    df_cleaned = df_main.iloc[rows].reset_index(drop=True)
+    pitch_values, normalized_values = pitches.tolist(), normalized.tolist()
+    df_cleaned['pitch_sequence'] = [pitch_values[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+    df_cleaned['normalized_pitch_sequence'] = [normalized_values[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+    df_cleaned.to_csv(os.path.join(output_dir, 'dataset_cleaned.csv'), index=False)
+
+    df_train = df_cleaned.iloc[split_rows['train']]
+    df_test = process_test_dataframe(df_cleaned.iloc[split_rows['test']].copy())
+
+    df_train.to_csv(os.path.join(output_dir, 'dataset_train.csv'), index=False)
+    df_test.to_csv(os.path.join(output_dir, 'dataset_test.csv'), index=False)
+
+    # Binary copies of the splits, loaded without re-parsing the stringified lists
+    save_dataset(os.path.join(output_dir, 'dataset_train.npz'), **dataset_from_dataframe(df_train))
+    save_dataset(os.path.join(output_dir, 'dataset_test.npz'), **dataset_from_dataframe(df_test))
+
+    manifest[output_dir] = output_key
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return window_dir
+
+if __name__ == "__main__":
+    # Parse, clean, normalize, split and window the dataset, reusing every cached stage that is unchanged
+    window_dir = run_pipeline('dataset/dataset_all.csv')
+    print(f"Training windows saved to {window_dir}")
     
     # df = pd.read_csv('dataset/pop-set-ext.csv')
 
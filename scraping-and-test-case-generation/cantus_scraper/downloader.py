@@ -0,0 +1,148 @@
+import csv
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Statuses that mean a source is done and does not need to be fetched again when resuming
+FINAL_STATUSES = {"saved", "no_volpiano", "missing"}
+
+
+class SourceDownloader:
+    """
+    Concurrent downloader for Cantus source CSVs.
+
+    - One pooled requests.Session shared by a bounded thread pool
+    - Conditional requests (ETag / Last-Modified) so unchanged sources come back as 304
+    - A JSON manifest written as sources finish, so an interrupted run resumes where it stopped
+    - The header line is checked for the required column while streaming, so each source is
+      fetched once and sources without the column are abandoned after the first line
+    """
+    def __init__(self, out_dir="validCSVs", manifest_path="manifest.json", max_workers=16, timeout=30,
+                 required_column="volpiano"):
+        self.out_dir = out_dir
+        self.manifest_path = manifest_path
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.required_column = required_column
+
+        self.session = requests.Session()
+        retries = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, max_retries=retries)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.manifest = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r") as f:
+                self.manifest = json.load(f)
+        self._lock = threading.Lock()
+
+    def save_manifest(self):
+        """Write the manifest atomically"""
+        with self._lock:
+            tmp_path = self.manifest_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.manifest, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.manifest_path)
+
+    def _conditional_headers(self, entry):
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def fetch_source(self, number, url):
+        """
+        Fetch one source CSV and save it if its header has the required column.
+
+        Returns:
+        - the manifest entry for the source
+        """
+        entry = self.manifest.get(number, {})
+        file_path = os.path.join(self.out_dir, f"{number}.csv")
+        headers = self._conditional_headers(entry) if entry.get("status") in FINAL_STATUSES else {}
+        if entry.get("status") == "saved" and not os.path.exists(file_path):
+            headers = {}
+
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code == 304:
+                return dict(entry, cached=True)
+            if response.status_code != 200:
+                return {"status": "missing", "http_status": response.status_code}
+
+            new_entry = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+
+            # Read just enough of the body to see the header line
+            chunks = response.iter_content(chunk_size=64 * 1024)
+            head = b""
+            for chunk in chunks:
+                head += chunk
+                if b"\n" in head:
+                    break
+            header_line = head.split(b"\n", 1)[0].decode("utf-8", errors="replace")
+            header = next(csv.reader([header_line]), [])
+            if self.required_column not in header:
+                return dict(new_entry, status="no_volpiano")
+
+            # Stream the rest of the body to a temporary file, then move it into place
+            tmp_path = file_path + ".part"
+            with open(tmp_path, "wb") as csv_file:
+                csv_file.write(head)
+                for chunk in chunks:
+                    csv_file.write(chunk)
+            os.replace(tmp_path, file_path)
+            return dict(new_entry, status="saved")
+
+    def download_sources(self, numbers, url_template, refresh=False, save_every=25):
+        """
+        Download many sources concurrently.
+
+        Args:
+        - numbers: Source ids
+        - url_template: URL with a {number} placeholder
+        - refresh: Revalidate sources that are already done (cheap 304s when unchanged);
+          otherwise they are skipped entirely
+        - save_every: Write the manifest after this many finished sources
+
+        Returns:
+        - the manifest, keyed by source id
+        """
+        os.makedirs(self.out_dir, exist_ok=True)
+        pending = [number for number in numbers
+                   if refresh or self.manifest.get(number, {}).get("status") not in FINAL_STATUSES]
+        print(f"{len(numbers) - len(pending)} sources already done, fetching {len(pending)}...")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.fetch_source, number, url_template.format(number=number)): number
+                       for number in pending}
+            for done, future in enumerate(as_completed(futures), start=1):
+                number = futures[future]
+                try:
+                    entry = future.result()
+                except requests.RequestException as e:
+                    print(f"Error processing source {number}: {e}")
+                    entry = {"status": "error", "error": str(e)}
+
+                cached = entry.pop("cached", False)
+                print(f"Source {number}: {'unchanged' if cached else entry['status']}")
+                with self._lock:
+                    self.manifest[number] = entry
+                if done % save_every == 0:
+                    self.save_manifest()
+
+        self.save_manifest()
+        return self.manifest
+
+    def fetch_pages(self, urls):
+        """Fetch several pages concurrently; returns the responses in the order of `urls`"""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(lambda url: self.session.get(url, timeout=self.timeout), urls))
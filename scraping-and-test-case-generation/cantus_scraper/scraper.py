@@ -1,14 +1,18 @@
-import requests
+import argparse
 from bs4 import BeautifulSoup
 import re
-BASE_URL = "https://cantusdatabase.org/sources/"
+from downloader import SourceDownloader
+BASE_URL = "https://cantusdatabase.org"
 PAGE_COUNT = 6  
 pattern = re.compile(r"^/source/\d+$")
+parser = argparse.ArgumentParser(description="Scrape the list of Cantus sources.")
+parser.add_argument("--base-url", default=BASE_URL, help="Cantus server, e.g. a local stand-in for testing.")
+args = parser.parse_args()
+urls = [f"{args.base_url}/sources/?page={page}" for page in range(1, PAGE_COUNT + 1)]
+print(f"Fetching {len(urls)} pages...")
+responses = SourceDownloader(max_workers=PAGE_COUNT).fetch_pages(urls)
 with open("valid_sources.txt", "w") as file:
-    for page in range(1, PAGE_COUNT + 1):
-        url = f"{BASE_URL}?page={page}"
-        print(f"Fetching page: {url}")
-        response = requests.get(url)
+    for page, response in enumerate(responses, start=1):
         if response.status_code == 200:
             soup = BeautifulSoup(response.text, "html.parser")
             links = soup.find_all("a", href=pattern)
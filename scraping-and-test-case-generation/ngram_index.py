@@ -0,0 +1,222 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+
+class NGramIndex:
+    """
+    Hashed context table over integer-encoded notes, shared by the distractor generators.
+
+    Notes are mapped to ids 0..V-1 (vocab_ holds the note values). For every context size the
+    (context, next note) pairs are stored once in CSR form: the sorted context codes, an indptr
+    array, and the distinct next-note ids of each context back to back. A lookup is one
+    searchsorted per context size, and a whole batch of sequences is extended one note at a time
+    with the same walk, backing off from the longest context to shorter ones and finally to
+    sampling notes by their corpus frequency.
+
+    context_size follows the convention of the original build_constraints: context_size = N uses
+    the N - 1 previous notes as the context.
+    """
+    def __init__(self, context_sizes=(4, 3, 2)):
+        if min(context_sizes) < 2:
+            raise ValueError("context_size must be at least 2 (one note of context)")
+        self.context_sizes = tuple(sorted(context_sizes, reverse=True))
+
+    def fit(self, sequences):
+        """
+        Index every (context, next note) pair of the sequences.
+
+        Args:
+        - sequences: List of note sequences (lists or arrays of note values)
+
+        Returns:
+        - self
+        """
+        lengths = np.array([len(sequence) for sequence in sequences], dtype=np.int64)
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        # Notes keep the corpus dtype, so integer pitches come back from generate() as integers;
+        # empty sequences are skipped so they do not upcast the buffer to float
+        arrays = [np.asarray(sequence) for sequence in sequences if len(sequence)]
+        notes = np.concatenate(arrays) if arrays else np.empty(0)
+
+        self.vocab_, ids, counts = np.unique(notes, return_inverse=True, return_counts=True)
+        ids = ids.reshape(-1).astype(np.int64)
+        self.n_notes_ = len(self.vocab_)
+        # Fallback sampling by corpus frequency, as random.choice over every note in the corpus
+        self.note_cdf_ = np.cumsum(counts) / max(counts.sum(), 1)
+
+        self.tables_ = []
+        for context_size in self.context_sizes:
+            order = context_size - 1
+            # Start of every window that has order notes of context and a next note, within one sequence
+            n_windows = np.maximum(lengths - order, 0)
+            starts = np.repeat(offsets[:-1] - np.concatenate(([0], np.cumsum(n_windows)[:-1])), n_windows)
+            starts = starts + np.arange(n_windows.sum(), dtype=np.int64)
+
+            codes = self._encode(np.stack([ids[starts + k] for k in range(order)], axis=1)) \
+                if len(starts) else np.empty(0, dtype=np.int64)
+            pairs = np.unique(codes * self.n_notes_ + ids[starts + order])
+            contexts, first = np.unique(pairs // self.n_notes_, return_index=True)
+            indptr = np.append(first, len(pairs)).astype(np.int64)
+            self.tables_.append((order, contexts, indptr, pairs % self.n_notes_))
+        return self
+
+    def _encode(self, context_ids):
+        """Base-V code of each row of note ids; rows containing an unknown note (-1) get -1"""
+        codes = np.zeros(len(context_ids), dtype=np.int64)
+        for column in context_ids.T:
+            codes = codes * self.n_notes_ + column
+        codes[np.any(context_ids < 0, axis=1)] = -1
+        return codes
+
+    def encode_notes(self, notes):
+        """Map note values to ids, with -1 for notes that never occur in the corpus"""
+        notes = np.asarray(notes)
+        if self.n_notes_ == 0:
+            return np.full(notes.shape, -1, dtype=np.int64)
+        index = np.minimum(np.searchsorted(self.vocab_, notes), max(self.n_notes_ - 1, 0))
+        found = self.vocab_[index] == notes
+        return np.where(found, index, -1)
+
+    def lookup(self, context_ids, context_size):
+        """
+        Find contexts in the table of one context size.
+
+        Args:
+        - context_ids: Note ids, shape (n, context_size - 1)
+        - context_size: Which table to search
+
+        Returns:
+        - start, count: the next-note ids of row i are next_ids[start[i]:start[i] + count[i]];
+          count is 0 for contexts that never occur
+        """
+        order, contexts, indptr, _ = self.tables_[self.context_sizes.index(context_size)]
+        codes = self._encode(np.asarray(context_ids, dtype=np.int64).reshape(-1, order))
+        if len(contexts) == 0:
+            return np.zeros(len(codes), dtype=np.int64), np.zeros(len(codes), dtype=np.int64)
+        position = np.minimum(np.searchsorted(contexts, codes), len(contexts) - 1)
+        found = (codes >= 0) & (contexts[position] == codes)
+        start = np.where(found, indptr[position], 0)
+        count = np.where(found, indptr[position + 1] - indptr[position], 0)
+        return start, count
+
+    def next_notes(self, context, context_size=None):
+        """Distinct note values that follow a context (a sequence of note values) in the corpus"""
+        context_size = context_size or len(context) + 1
+        start, count = self.lookup(self.encode_notes(context)[None, :], context_size)
+        next_ids = self.tables_[self.context_sizes.index(context_size)][3]
+        return self.vocab_[next_ids[start[0]:start[0] + count[0]]]
+
+    def _history(self, start_seqs):
+        """Ids of the last max-order notes of each start sequence, left-padded with -1"""
+        width = self.context_sizes[0] - 1
+        tails = [list(sequence)[-width:] for sequence in start_seqs]
+        lengths = np.array([len(tail) for tail in tails], dtype=np.int64)
+        if np.all(lengths == width):
+            return self.encode_notes(np.array(tails, dtype=np.float64).reshape(-1, width))
+
+        history = np.full((len(tails), width), -1, dtype=np.int64)
+        notes = self.encode_notes(np.array([note for tail in tails for note in tail], dtype=np.float64))
+        rows = np.repeat(np.arange(len(tails)), lengths)
+        columns = np.arange(len(notes)) - np.repeat(np.cumsum(lengths) - lengths, lengths) + np.repeat(width - lengths, lengths)
+        history[rows, columns] = notes
+        return history
+
+    def generate(self, start_seqs, length=8, rng=None):
+        """
+        Continue every start sequence by `length` notes in one batched walk.
+
+        Each sequence samples its next note uniformly among the distinct notes that follow its
+        current context. When its context is missing it backs off to the next shorter context
+        size for the rest of the sequence, and after the shortest one it samples notes by corpus
+        frequency, as generate_sequence_with_fallback does.
+
+        Args:
+        - start_seqs: List of note sequences (or a 2D array), one per continuation
+        - length: Number of notes to generate
+        - rng: numpy Generator or seed
+
+        Returns:
+        - array of note values, shape (len(start_seqs), length)
+        """
+        rng = np.random.default_rng(rng)
+        history = self._history(start_seqs)
+        n_rows = len(history)
+        level = np.zeros(n_rows, dtype=np.int64)
+        generated = np.empty((n_rows, length), dtype=np.int64)
+
+        for step in range(length):
+            done = np.zeros(n_rows, dtype=bool)
+            for index, (order, contexts, indptr, next_ids) in enumerate(self.tables_):
+                rows = np.flatnonzero(~done & (level == index))
+                if len(rows) == 0:
+                    continue
+                start, count = self.lookup(history[rows, history.shape[1] - order:], self.context_sizes[index])
+                found = count > 0
+                choice = start[found] + rng.integers(0, count[found])
+                generated[rows[found], step] = next_ids[choice]
+                done[rows[found]] = True
+                level[rows[~found]] = index + 1
+
+            # Rows with no usable context at any size fall back to notes drawn by corpus frequency
+            rows = np.flatnonzero(~done)
+            fallback = np.searchsorted(self.note_cdf_, rng.random(len(rows)), side='right')
+            generated[rows, step] = np.minimum(fallback, self.n_notes_ - 1)
+
+            history[:, :-1] = history[:, 1:]
+            history[:, -1] = generated[:, step]
+
+        return self.vocab_[generated]
+
+
+# Index shared by the worker processes of generate_options, set once per worker by _init_worker
+_worker_index = None
+
+
+def _init_worker(index):
+    global _worker_index
+    _worker_index = index
+
+
+def _generate_shard(args):
+    """Generate the options of one shard of rows from the shard's own seed"""
+    start_seqs, n_options, length, seed = args
+    repeated = [sequence for sequence in start_seqs for _ in range(n_options)]
+    generated = _worker_index.generate(repeated, length=length, rng=np.random.default_rng(seed))
+    return generated.reshape(len(start_seqs), n_options, length)
+
+
+def generate_options(index, start_seqs, n_options=9, length=8, seed=None, shard_size=1024, workers=1):
+    """
+    Generate n_options distractor continuations for every start sequence.
+
+    Rows are split into fixed-size shards and every shard draws from its own Generator, spawned
+    from one SeedSequence, so the output depends only on the seed and shard_size and is the same
+    for any number of workers.
+
+    Args:
+    - index: Fitted NGramIndex
+    - start_seqs: List of note sequences, one per row
+    - n_options: Number of continuations per row
+    - length: Number of notes per continuation
+    - seed: Seed (int or SeedSequence) for the whole run
+    - shard_size: Number of rows per shard
+    - workers: Number of worker processes; 1 generates in this process
+
+    Returns:
+    - array of note values, shape (len(start_seqs), n_options, length)
+    """
+    seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    bounds = list(range(0, len(start_seqs), shard_size))
+    shards = [(start_seqs[start:start + shard_size], n_options, length, child)
+              for start, child in zip(bounds, seed_sequence.spawn(len(bounds)))]
+
+    if workers > 1 and len(shards) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(index,)) as executor:
+            results = list(executor.map(_generate_shard, shards))
+    else:
+        _init_worker(index)
+        results = [_generate_shard(shard) for shard in shards]
+    if not results:
+        return np.empty((0, n_options, length), dtype=index.vocab_.dtype)
+    return np.concatenate(results)
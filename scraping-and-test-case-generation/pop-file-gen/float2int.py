@@ -1,28 +1,38 @@
 import csv
 import ast
+import os
+import sys
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from pitch_scale import PitchQuantizer
+from windowing import parse_sequences
 def parse_float_sequence(seq_str):
     return ast.literal_eval(seq_str.strip())
+def paired_values(pitch_strings, normalized_strings):
+    """Flatten two list-string columns into aligned arrays, pairing values row by row like zip()."""
+    pitches, pitch_offsets = parse_sequences(pitch_strings, dtype=np.int64)
+    normalized, normalized_offsets = parse_sequences(normalized_strings)
+    lengths = np.minimum(np.diff(pitch_offsets), np.diff(normalized_offsets))
+    position = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return (normalized[np.repeat(normalized_offsets[:-1], lengths) + position],
+            pitches[np.repeat(pitch_offsets[:-1], lengths) + position])
 def build_conversion_map(input_file):
-    """Build a dictionary mapping normalized values (float) to pitch values (int)."""
-    conversion_map = {}
+    """Build a nearest-value quantizer mapping normalized values (float) to pitch values (int)."""
     with open(input_file, "r", newline="", encoding="utf-8") as infile:
-        reader = csv.DictReader(infile)
-        for row in reader:
-            pitch_sequence = ast.literal_eval(row["pitch_sequence"])
-            normalized_sequence = ast.literal_eval(row["normalized_pitch_sequence"])
-            for norm, pitch in zip(normalized_sequence, pitch_sequence):
-                conversion_map[norm] = pitch
-    return conversion_map
-def find_nearest(value, conversion_map):
-    """Find the nearest key in the conversion map for a given normalized value."""
-    return min(conversion_map.keys(), key=lambda k: abs(k - value))
-def apply_conversion(row, conversion_map, columns):
-    """Convert normalized values to pitch values in the specified columns using nearest-match logic."""
+        rows = list(csv.DictReader(infile))
+    normalized, pitches = paired_values([row["pitch_sequence"] for row in rows],
+                                        [row["normalized_pitch_sequence"] for row in rows])
+    return PitchQuantizer.from_pairs(normalized, pitches)
+def apply_conversion(rows, conversion_map, columns):
+    """Convert normalized values to pitch values in the specified columns, one vectorized lookup per column."""
     for column in columns:
-        if column in row and row[column].strip():
-            normalized_list = ast.literal_eval(row[column])
-            converted_list = [conversion_map.get(find_nearest(norm, conversion_map), norm) for norm in normalized_list]
-            row[column] = str(converted_list)
+        filled = [row for row in rows if row.get(column) and row[column].strip()]
+        if not filled:
+            continue
+        normalized, offsets = parse_sequences([row[column] for row in filled])
+        converted = conversion_map.quantize(normalized).tolist()
+        for row, start, end in zip(filled, offsets[:-1], offsets[1:]):
+            row[column] = str(converted[start:end])
 def main(input_file="output_2.csv", output_file="updated_pop.csv"):
     conversion_map = build_conversion_map(input_file)
     with open(input_file, "r", newline="", encoding="utf-8") as infile:
@@ -30,8 +40,7 @@ def main(input_file="output_2.csv", output_file="updated_pop.csv"):
         rows = list(reader)
         fieldnames = reader.fieldnames
     columns_to_update = ["normalized_pitch_sequence", "input_pitch"] + [f"option_{i}" for i in range(1, 11)]
-    for row in rows:
-        apply_conversion(row, conversion_map, columns_to_update)
+    apply_conversion(rows, conversion_map, columns_to_update)
     with open(output_file, "w", newline="", encoding="utf-8") as outfile:
         writer = csv.DictWriter(outfile, fieldnames=fieldnames)
         writer.writeheader()
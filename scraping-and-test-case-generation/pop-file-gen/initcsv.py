@@ -1,18 +1,9 @@
-import pickle
 import csv
-class Melody:
-    def __init__(self, name, pitch_sequence):
-        self.name = name
-        self.pitch_sequence = pitch_sequence
-    def __repr__(self):
-        return f"Melody(name={self.name}, pitch_sequence={self.pitch_sequence})"
-class MelodyStore:
-    def __init__(self):
-        self.melodies = []
-    def add_melody(self, melody):
-        self.melodies.append(melody)
-    def __repr__(self):
-        return f"MelodyStore(melodies={self.melodies})"
+import os
+import sys
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from melody_corpus import read_corpus
 def build_conversion_map(input_csv_file):
     """Build a dictionary mapping pitch values to normalized values from input.csv."""
     conversion_map = {}
@@ -24,28 +15,31 @@ def build_conversion_map(input_csv_file):
             for pitch, norm in zip(pitch_sequence, normalized_sequence):
                 conversion_map[pitch] = norm
     return conversion_map
-def normalize_pitch_sequence(pitch_sequence, conversion_map):
-    """Convert pitch values to normalized values using the conversion map."""
-    return [conversion_map.get(pitch, 0.0) for pitch in pitch_sequence]
-def save_to_csv_from_pickle(pickle_file, normalization_map, output_csv_file):
-    """Process melodies.pkl and generate the output CSV file."""
-    with open(pickle_file, 'rb') as file:
-        melody_store = pickle.load(file)
+def normalize_corpus(corpus, conversion_map):
+    """Convert every pitch of the corpus to its normalized value in one table lookup (0.0 when unmapped)."""
+    notes = np.asarray(corpus.pitches[corpus.offsets[0]:corpus.offsets[-1]], dtype=np.int64)
+    table = np.zeros(max(int(notes.max(initial=0)), max(conversion_map, default=0)) + 1, dtype=np.float64)
+    table[list(conversion_map)] = list(conversion_map.values())
+    return table[notes]
+def save_to_csv_from_corpus(corpus_path, normalization_map, output_csv_file):
+    """Process the MIDI melody corpus and generate the output CSV file."""
+    corpus = read_corpus(corpus_path)
+    normalized = normalize_corpus(corpus, normalization_map).tolist()
+    bounds = (corpus.offsets - corpus.offsets[0]).tolist()
     fieldnames = ["melody", "pitch_sequence", "normalized_pitch_sequence", "option_1"]
     filled_option_1_count = 0
     with open(output_csv_file, "w", newline="", encoding="utf-8") as outfile:
         writer = csv.DictWriter(outfile, fieldnames=fieldnames)
         writer.writeheader()
-        for melody in melody_store.melodies:
-            pitch_sequence = melody.pitch_sequence
-            normalized_sequence = normalize_pitch_sequence(pitch_sequence, normalization_map)
+        for name, pitch_sequence, start, end in zip(corpus.names.tolist(), corpus.to_lists(), bounds[:-1], bounds[1:]):
+            normalized_sequence = normalized[start:end]
             if len(normalized_sequence) > 12:
                 option_1 = normalized_sequence[-8:]
                 filled_option_1_count += 1
             else:
                 option_1 = "NOT_ENOUGH_NOTES"
             writer.writerow({
-                "melody": melody.name,
+                "melody": name,
                 "pitch_sequence": pitch_sequence,
                 "normalized_pitch_sequence": normalized_sequence,
                 "option_1": option_1,
@@ -53,10 +47,10 @@ def save_to_csv_from_pickle(pickle_file, normalization_map, output_csv_file):
     print(f"Total filled option_1 entries: {filled_option_1_count}")
     print(f"CSV file saved to {output_csv_file}")
 def main():
-    pickle_file = "melodies_midi.pkl"  
+    corpus_path = "melodies_midi" if os.path.exists("melodies_midi") else "melodies_midi.pkl"
     input_csv_file = "input.csv"  
     output_csv_file = "output.csv"  
     normalization_map = build_conversion_map(input_csv_file)
-    save_to_csv_from_pickle(pickle_file, normalization_map, output_csv_file)
+    save_to_csv_from_corpus(corpus_path, normalization_map, output_csv_file)
 if __name__ == "__main__":
     main()
@@ -1,74 +1,13 @@
+import argparse
 import csv
 import ast
-import random
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from ngram_index import NGramIndex, generate_options
 def parse_float_sequence(seq_str):
     return ast.literal_eval(seq_str.strip())
-def build_constraints(all_sequences, context_size):
-    """
-    Build constraints for a given context_size.
-    context_size = N means we use (N-1) previous notes as the context.
-    """
-    constraints = {}
-    order = context_size - 1
-    for seq in all_sequences:
-        for i in range(len(seq) - order):
-            context = tuple(seq[i:i+order])
-            next_note = seq[i+order]
-            if context not in constraints:
-                constraints[context] = set()
-            constraints[context].add(next_note)
-    return constraints
-def generate_with_context(constraints, start_seq, length=8, context_size=4):
-    """
-    Attempt to generate up to `length` notes using the given constraints and context_size.
-    Returns the list of generated notes (could be shorter if stuck).
-    """
-    order = context_size - 1
-    if len(start_seq) < order:
-        return []
-    current_context = tuple(start_seq[-order:])
-    generated = []
-    for _ in range(length):
-        if current_context in constraints and constraints[current_context]:
-            possible_next = list(constraints[current_context])
-            next_note = random.choice(possible_next)
-            generated.append(next_note)
-            if order > 0:
-                current_context = tuple(list(current_context[1:]) + [next_note])
-            else:
-                current_context = (next_note,)
-        else:
-            break
-    return generated
-def generate_sequence_with_fallback(constraints_4, constraints_3, constraints_2, start_seq, length=8, fallback_notes=None):
-    """
-    Generate a sequence of length=8 using:
-    1) context_size=4 constraints
-    2) if can't reach length 8, use context_size=3
-    3) if still can't reach length 8, use context_size=2
-    4) if still can't reach length 8, fill with random notes
-    """
-    partial = generate_with_context(constraints_4, start_seq, length=length, context_size=4)
-    if len(partial) == length:
-        return partial
-    needed = length - len(partial)
-    seq_so_far = start_seq + partial
-    partial2 = generate_with_context(constraints_3, seq_so_far, length=needed, context_size=3)
-    partial += partial2
-    if len(partial) == length:
-        return partial
-    needed = length - len(partial)
-    seq_so_far = start_seq + partial
-    partial3 = generate_with_context(constraints_2, seq_so_far, length=needed, context_size=2)
-    partial += partial3
-    if len(partial) == length:
-        return partial
-    needed = length - len(partial)
-    if fallback_notes and len(fallback_notes) > 0:
-        for _ in range(needed):
-            partial.append(random.choice(fallback_notes))
-    return partial
-def main(input_csv="input.csv", output_csv="output_2.csv"):
+def main(input_csv="input.csv", output_csv="output_2.csv", seed=None, workers=1, shard_size=1024):
     with open(input_csv, "r", newline="", encoding="utf-8") as f:
         reader = csv.DictReader(f)
         rows = list(reader)
@@ -76,23 +15,21 @@ def main(input_csv="input.csv", output_csv="output_2.csv"):
     for row in rows:
         norm_seq = parse_float_sequence(row["normalized_pitch_sequence"])
         all_norm_seqs.append(norm_seq)
-    constraints_4 = build_constraints(all_norm_seqs, context_size=4)
-    constraints_3 = build_constraints(all_norm_seqs, context_size=3)
-    constraints_2 = build_constraints(all_norm_seqs, context_size=2)
-    all_notes = [note for seq in all_norm_seqs for note in seq]
+    index = NGramIndex(context_sizes=(4, 3, 2)).fit(all_norm_seqs)
     with open(output_csv, "r", newline="", encoding="utf-8") as f:
         output_reader = csv.DictReader(f)
         output_rows = list(output_reader)
         fieldnames = output_reader.fieldnames
+    input_seqs = [parse_float_sequence(row["input_pitch"]) for row in output_rows]
+    option_columns = [f"option_{j}" for j in range(1, 11)]
+    # Every option of every row in one seeded, sharded run; reproducible for any worker count
+    generated = generate_options(index, input_seqs, n_options=len(option_columns), length=8,
+                                 seed=seed, shard_size=shard_size, workers=workers)
     for i, row in enumerate(output_rows):
-        input_seq = parse_float_sequence(row["input_pitch"])
-        for oc in [f"option_{j}" for j in range(1, 11)]:
-            if oc in row and row[oc].strip() != "":
-                continue  
-            generated_ending = generate_sequence_with_fallback(
-                constraints_4, constraints_3, constraints_2, input_seq,
-                length=8, fallback_notes=all_notes
-            )
+        for k, oc in enumerate(option_columns):
+            if oc in row and row[oc] is not None and row[oc].strip() != "":
+                continue
+            generated_ending = generated[i, k].tolist()
             row[oc] = str(generated_ending)
             if oc == "option_1":
                 print(f"Wrote option_1 for row {i}: {generated_ending}")
@@ -101,4 +38,11 @@ def main(input_csv="input.csv", output_csv="output_2.csv"):
         writer.writeheader()
         writer.writerows(output_rows)
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Fill the empty option columns with n-gram distractor continuations.")
+    parser.add_argument("--input", default="input.csv", help="CSV with the normalized_pitch_sequence corpus.")
+    parser.add_argument("--output", default="output_2.csv", help="CSV with input_pitch rows, updated in place.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible options.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes.")
+    parser.add_argument("--shard-size", type=int, default=1024, help="Rows per independently seeded shard.")
+    args = parser.parse_args()
+    main(args.input, args.output, seed=args.seed, workers=args.workers, shard_size=args.shard_size)
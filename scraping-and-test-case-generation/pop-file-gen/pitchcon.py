@@ -1,32 +1,33 @@
 import csv
-import ast
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from pitch_scale import PitchNormalizer
+from windowing import parse_sequences
 input_file = 'output_2.csv'
 output_file = 'updated_pop.csv'
-def denormalize(norm_val, min_norm, max_norm, min_pitch, max_pitch):
-    if max_norm == min_norm:
-        return (min_pitch + max_pitch) / 2.0
-    return ((norm_val - min_norm) / (max_norm - min_norm)) * (max_pitch - min_pitch) + min_pitch
-with open(input_file, 'r', newline='', encoding='utf-8') as infile, \
-     open(output_file, 'w', newline='', encoding='utf-8') as outfile:
+def denormalize_column(rows, column, scales):
+    """Denormalize the filled cells of a column with each row's own scale, in one vectorized pass."""
+    filled = [i for i, row in enumerate(rows) if row.get(column) and row[column].strip()]
+    if not filled:
+        return
+    normalized, offsets = parse_sequences([rows[i][column] for i in filled])
+    row_scales = PitchNormalizer(scales.min_pitch[filled], scales.max_pitch[filled])
+    pitches = row_scales.inverse(normalized, offsets=offsets).tolist()
+    for i, start, end in zip(filled, offsets[:-1], offsets[1:]):
+        rows[i][column] = str(pitches[start:end])
+with open(input_file, 'r', newline='', encoding='utf-8') as infile:
     reader = csv.DictReader(infile)
     fieldnames = reader.fieldnames
+    rows = list(reader)
+# Each row maps its normalized range back onto its own pitch range
+pitch_buffer, pitch_offsets = parse_sequences([row['pitch_sequence'] for row in rows])
+normalized_buffer, normalized_offsets = parse_sequences([row['normalized_pitch_sequence'] for row in rows])
+scales = PitchNormalizer.from_anchors(pitch_buffer, normalized_buffer, pitch_offsets, normalized_offsets)
+for column in ['input_pitch'] + [f'option_{i}' for i in range(1, 11)]:
+    denormalize_column(rows, column, scales)
+with open(output_file, 'w', newline='', encoding='utf-8') as outfile:
     writer = csv.DictWriter(outfile, fieldnames=fieldnames)
     writer.writeheader()
-    for row in reader:
-        pitch_sequence = ast.literal_eval(row['pitch_sequence'])
-        normalized_pitch_sequence = ast.literal_eval(row['normalized_pitch_sequence'])
-        min_pitch, max_pitch = min(pitch_sequence), max(pitch_sequence)
-        min_norm, max_norm = min(normalized_pitch_sequence), max(normalized_pitch_sequence)
-        if 'input_pitch' in row and row['input_pitch'].strip():
-            input_norm_list = ast.literal_eval(row['input_pitch'])
-            input_pitch_list = [round(denormalize(val, min_norm, max_norm, min_pitch, max_pitch))
-                                for val in input_norm_list]
-            row['input_pitch'] = str(input_pitch_list)
-        for opt_col in ['option_1','option_2','option_3','option_4','option_5','option_6','option_7','option_8','option_9','option_10']:
-            if row[opt_col].strip():
-                opt_norm_list = ast.literal_eval(row[opt_col])
-                opt_pitch_list = [round(denormalize(val, min_norm, max_norm, min_pitch, max_pitch))
-                                  for val in opt_norm_list]
-                row[opt_col] = str(opt_pitch_list)
-        writer.writerow(row)
+    writer.writerows(rows)
 print("Conversion complete. Output written to:", output_file)
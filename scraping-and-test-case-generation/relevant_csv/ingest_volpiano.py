@@ -0,0 +1,98 @@
+import argparse
+import csv
+import hashlib
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from dataset_io import save_dataset
+from volpiano import get_tokenizer
+
+VALID_CSV_DIR = "validCSVs"
+OUTPUT_FILE = "volpiano_entries.npz"
+METADATA_COLUMNS = ("cantus_id", "mode")
+
+
+def extract_melodies(csv_path):
+    """
+    Read one source CSV in a single pass and pull out the melodies that start with '1'.
+
+    Returns:
+    - list of (volpiano, cantus_id, mode) tuples; empty if the file has no volpiano column
+    """
+    melodies = []
+    try:
+        with open(csv_path, "r", encoding="utf-8", newline="") as csv_file:
+            reader = csv.reader(csv_file)
+            header = next(reader, [])
+            if "volpiano" not in header:
+                return melodies
+            volpiano_index = header.index("volpiano")
+            metadata_index = [header.index(column) if column in header else None for column in METADATA_COLUMNS]
+            for row in reader:
+                if len(row) <= volpiano_index:
+                    continue
+                volpiano = row[volpiano_index].strip()
+                if volpiano.startswith("1"):
+                    metadata = tuple(row[i] if i is not None and i < len(row) else "" for i in metadata_index)
+                    melodies.append((volpiano,) + metadata)
+    except (OSError, UnicodeDecodeError, csv.Error) as e:
+        print(f"Error processing {csv_path}: {e}")
+    return melodies
+
+
+def ingest(csv_dir=VALID_CSV_DIR, output_path=OUTPUT_FILE, workers=None):
+    """
+    Scan every CSV in csv_dir with a process pool, deduplicate the melodies and write them to a binary dataset.
+
+    Replaces filter_nonempty_csvs.py -> extract_volpiano.py -> remove_duplicates.py: each file is read once,
+    nothing is copied to an intermediate directory, and duplicates are dropped as results stream in by keeping
+    only a 16-byte digest per melody seen. Files are merged in sorted order, so the first occurrence of a melody
+    (and its metadata) wins regardless of the number of workers.
+
+    Args:
+    - csv_dir: Directory with the downloaded source CSVs
+    - output_path: Output .npz path
+    - workers: Number of worker processes (None = one per CPU)
+
+    Returns:
+    - dict with the total and unique melody counts
+    """
+    paths = sorted(os.path.join(csv_dir, name) for name in os.listdir(csv_dir) if name.endswith(".csv"))
+
+    seen = set()
+    melodies, metadata = [], {column: [] for column in METADATA_COLUMNS}
+    total = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for rows in executor.map(extract_melodies, paths, chunksize=16):
+            for volpiano, *values in rows:
+                total += 1
+                digest = hashlib.blake2b(volpiano.encode("utf-8"), digest_size=16).digest()
+                if digest in seen:
+                    continue
+                seen.add(digest)
+                melodies.append(volpiano)
+                for column, value in zip(METADATA_COLUMNS, values):
+                    metadata[column].append(value)
+
+    pitches, offsets, skipped = get_tokenizer().parse_chunk(melodies)
+    save_dataset(output_path, offsets=offsets, pitches=pitches, melody=melodies,
+                 metadata={**metadata, "skipped": skipped})
+    return {"files": len(paths), "total": total, "unique": len(melodies), "skipped": int(np.sum(skipped))}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract the unique volpiano melodies of all source CSVs into a .npz dataset.")
+    parser.add_argument("--csv-dir", default=VALID_CSV_DIR, help="Directory with the source CSVs.")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="Path to the output .npz file.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes.")
+    args = parser.parse_args()
+
+    counts = ingest(args.csv_dir, args.output, args.workers)
+    print(f"Scanned {counts['files']} CSV files")
+    print(f"Total volpiano melodies starting with '1': {counts['total']}")
+    print(f"Total unique melodies: {counts['unique']}")
+    print(f"Duplicates removed: {counts['total'] - counts['unique']}")
+    print(f"Incomplete melodies (kept, flagged as skipped): {counts['skipped']}")
+    print(f"Volpiano melodies saved to {args.output}.")
@@ -0,0 +1,119 @@
+import numpy as np
+from scipy.linalg import cholesky, solve_triangular
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.utils import check_random_state
+from gp_fitting import fit_subset_kernel, normalize_targets
+
+
+class SparseGaussianProcessRegressor:
+    """
+    Sparse Gaussian Process regressor using the FITC approximation with M inducing windows.
+
+    Instead of fitting an exact GP on a small batch, the whole training set is summarised through
+    M inducing points, so fitting costs O(N * M^2) time and O(chunk_size * M + M^2) memory.
+    Any kernel works, since K_mm and K_mn are evaluated through the kernel itself, and
+    MelodySelector calls fit and predict(return_std=True) on it as on the exact regressor.
+    """
+    def __init__(self, kernel, n_inducing=500, inducing='random', alpha=1e-6, normalize_y=True,
+                 optimizer='fmin_l_bfgs_b', n_restarts_optimizer=0, chunk_size=4096, jitter=1e-8,
+                 random_state=None):
+        self.kernel = kernel
+        self.n_inducing = n_inducing
+        self.inducing = inducing
+        self.alpha = alpha
+        self.normalize_y = normalize_y
+        self.optimizer = optimizer
+        self.n_restarts_optimizer = n_restarts_optimizer
+        self.chunk_size = chunk_size
+        self.jitter = jitter
+        self.random_state = random_state
+
+    def _select_inducing_points(self, X, rng):
+        """Pick the inducing windows: an explicit array, a random subset or k-means centres"""
+        if not isinstance(self.inducing, str):
+            return np.asarray(self.inducing, dtype=np.float64)
+
+        n_inducing = min(self.n_inducing, len(X))
+        if self.inducing == 'random':
+            indices = np.sort(rng.choice(len(X), size=n_inducing, replace=False))
+            return np.asarray(X[indices], dtype=np.float64)
+        if self.inducing == 'kmeans':
+            kmeans = MiniBatchKMeans(n_clusters=n_inducing, random_state=rng, n_init=3,
+                                     batch_size=max(1024, 3 * n_inducing))
+            for start in range(0, len(X), self.chunk_size):
+                kmeans.partial_fit(np.asarray(X[start:start + self.chunk_size], dtype=np.float64))
+            return kmeans.cluster_centers_
+        raise ValueError(f"Unknown inducing point selection: {self.inducing}")
+
+    def fit(self, X, y):
+        """
+        Fit the sparse GP on all training windows.
+
+        Args:
+        - X: Training windows, shape (n_samples, window_size); any array supporting row slicing
+        - y: Next-note targets, shape (n_samples,)
+
+        Returns:
+        - self
+        """
+        rng = check_random_state(self.random_state)
+        y, self._y_train_mean, self._y_train_std = normalize_targets(y, self.normalize_y)
+
+        self.Z_ = self._select_inducing_points(X, rng)
+
+        # Learn the kernel hyperparameters with an exact GP on as many windows as inducing points, O(M^3)
+        self.kernel_ = fit_subset_kernel(self.kernel, X, y, len(self.Z_), self.alpha, self.optimizer,
+                                         self.n_restarts_optimizer, rng)
+
+        n_inducing = len(self.Z_)
+        K_mm = self.kernel_(self.Z_) + self.jitter * np.eye(n_inducing)
+        self.L_mm_ = cholesky(K_mm, lower=True)
+
+        # Accumulate B = I + V Lambda^-1 V^T and b = V Lambda^-1 y over chunks, where V = L_mm^-1 K_mn
+        B = np.eye(n_inducing)
+        b = np.zeros(n_inducing)
+        for start in range(0, len(X), self.chunk_size):
+            X_chunk = np.asarray(X[start:start + self.chunk_size], dtype=np.float64)
+            y_chunk = y[start:start + self.chunk_size]
+
+            V = solve_triangular(self.L_mm_, self.kernel_(self.Z_, X_chunk), lower=True, check_finite=False)
+            # FITC diagonal correction: Lambda = diag(K_nn - Q_nn) + noise
+            lam = self.kernel_.diag(X_chunk) - np.einsum('ij,ij->j', V, V)
+            lam = np.maximum(lam, 0.0) + self.alpha
+
+            V_scaled = V / lam
+            B += V_scaled @ V.T
+            b += V_scaled @ y_chunk
+
+        self.L_B_ = cholesky(B, lower=True)
+        self.c_ = solve_triangular(self.L_B_, b, lower=True, check_finite=False)
+        # Weights on the whitened inducing features: w = L_B^-T c
+        self.alpha_ = solve_triangular(self.L_B_.T, self.c_, lower=False, check_finite=False)
+        self.n_train_ = len(X)
+        return self
+
+    def predict(self, X, return_std=False):
+        """
+        Predict the next note for each query window.
+
+        Args:
+        - X: Query windows, shape (n_queries, window_size)
+        - return_std: Whether to also return the predictive standard deviation
+
+        Returns:
+        - y_mean, and y_std if return_std is True
+        """
+        X = np.asarray(X, dtype=np.float64)
+        V_star = solve_triangular(self.L_mm_, self.kernel_(self.Z_, X), lower=True, check_finite=False)
+        y_mean = V_star.T @ self.alpha_
+        y_mean = self._y_train_std * y_mean + self._y_train_mean
+
+        if not return_std:
+            return y_mean
+
+        # var = k** - Q** + V*^T B^-1 V*
+        W = solve_triangular(self.L_B_, V_star, lower=True, check_finite=False)
+        y_var = self.kernel_.diag(X) - np.einsum('ij,ij->j', V_star, V_star) + np.einsum('ij,ij->j', W, W)
+        y_var = np.maximum(y_var, 0.0) * self._y_train_std ** 2
+        return y_mean, np.sqrt(y_var)
+
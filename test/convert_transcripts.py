@@ -1,5 +1,9 @@
+import os
+import sys
 import pandas as pd
 from mido import Message, MidiFile, MidiTrack
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from volpiano import NOTE_MAPPING, get_tokenizer
 
 def parse_melody(melody, note_mapping):
     """
@@ -17,31 +21,16 @@ def parse_melody(melody, note_mapping):
         return 'skip'
     
     notes = []
-    i = 0
     duration_map = {
         'word_pause': 0,
         'syllable_pause': 0,
         'neume_pause': 0,
     }
-    while i < len(melody):
-        if melody[i:i+3] == '---':
-            notes.append((None, duration_map['word_pause']))
-            i += 3
-        elif melody[i:i+2] == '--': 
-            notes.append((None, duration_map['syllable_pause']))
-            i += 2
-        elif melody[i] == '-':
-            notes.append((None, duration_map['neume_pause']))
-            i += 1
-        elif melody[i].lower() in note_mapping:
-            note = note_mapping[melody[i].lower()]
-            if isinstance(note, int):
-                notes.append((note, 480))
-            i += 1
-        elif melody[i:i+4] == '---4':
-            break
+    for kind, note in get_tokenizer(note_mapping).tokens(melody):
+        if note is None:
+            notes.append((None, duration_map[kind]))
         else:
-            i += 1
+            notes.append((note, 480))
 
     return notes
 
@@ -78,35 +67,7 @@ def create_midi(melody, note_mapping, output_file="output.mid"):
 
 if __name__ == '__main__':
     # note mapping
-    note_mapping = {
-        '9': 55,  # G3
-        'a': 57,  # A3
-        'b': 59,  # B3
-        'c': 60,  # C4
-        'd': 62,  # D4
-        'e': 64,  # E4
-        'f': 65,  # F4
-        'g': 67,  # G4
-        'h': 69,  # A4
-        'j': 71,  # B4
-        'k': 72,  # C5
-        'l': 74,  # D5
-        'm': 76,  # E5
-        'n': 77,  # F5
-        'o': 79,  # G5
-        'p': 81,  # A5
-        'q': 83,  # B5
-        'r': 84,  # C6
-        's': 86,  # D6
-        '---4': 'end',
-        '---3': 'end',
-        '1--': 'start',
-        '---': 'word_pause',
-        '--': 'syllable_pause',
-        '-': 'neume_pause', 
-        '7': 'line_break',
-        '777': 'page_break',
-    }
+    note_mapping = NOTE_MAPPING
     
     # read data
     df = pd.read_csv('dataset/gregorian_chant_origional.csv')
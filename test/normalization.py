@@ -1,4 +1,26 @@
+import os
+import sys
+import numpy as np
 import pandas as pd
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pitch_scale import PitchNormalizer
+from windowing import parse_sequences
+
+def transform_column(column, transform, value_format):
+    """
+    Apply an elementwise transform to a column of comma-separated values in one vectorized pass.
+
+    Args:
+        column (Series): column of comma-separated number strings
+        transform (callable): function applied to the flat array of all values
+        value_format (str): printf-style format of each output value
+
+    Returns:
+        list: comma-separated strings of the transformed values
+    """
+    buffer, offsets = parse_sequences(column.astype(str))
+    values = np.char.mod(value_format, transform(buffer)).tolist()
+    return [','.join(values[start:end]) for start, end in zip(offsets[:-1], offsets[1:])]
 
 def normalize_pitch_data(file_path, input_colum_name, min_value, max_value):
     """
@@ -17,9 +39,8 @@ def normalize_pitch_data(file_path, input_colum_name, min_value, max_value):
     df = pd.read_csv(file_path)
 
     # Apply the normalization directly within the lambda function
-    df['Normalized Pitch'] = df[input_colum_name].apply(
-        lambda x: ','.join([f"{(int(p) - min_value) / (max_value - min_value):.4f}" for p in x.split(',')])
-    )
+    normalizer = PitchNormalizer(min_value, max_value)
+    df['Normalized Pitch'] = transform_column(df[input_colum_name], lambda pitches: normalizer.forward(np.trunc(pitches)), '%.4f')
 
     # Save the normalized data to the output file
     df.to_csv(file_path, index=False)
@@ -42,9 +63,8 @@ def reverse_normalization(file_path, colum_name, min_value, max_value):
     df = pd.read_csv(file_path)
 
     # Apply the reverse normalization
-    df['Reverse Normalization'] = df[colum_name].apply(
-        lambda x: ','.join([str(int(round(float(p) * (max_value - min_value) + min_value))) for p in x.split(',')])
-    )
+    normalizer = PitchNormalizer(min_value, max_value)
+    df['Reverse Normalization'] = transform_column(df[colum_name], normalizer.inverse, '%d')
 
     # Save the data with reverse normalization to the output file
     df.to_csv(file_path, index=False)
@@ -68,10 +88,9 @@ def normalize_multiple_columns(file_path, columns, min_value, max_value):
     df = pd.read_csv(file_path)
 
     # Normalize each column and add a new column with the normalized values
+    normalizer = PitchNormalizer(min_value, max_value)
     for col in columns:
-        df[f'normalized_{col}'] = df[col].apply(
-            lambda x: ','.join([f"{(int(p) - min_value) / (max_value - min_value):.4f}" for p in x.split(',')])
-        )
+        df[f'normalized_{col}'] = transform_column(df[col], lambda pitches: normalizer.forward(np.trunc(pitches)), '%.4f')
 
     # Save the data with normalized columns to the output file
     df.to_csv(file_path, index=False)
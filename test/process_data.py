@@ -1,38 +1,14 @@
+import os
+import sys
 import pandas as pd
-import test.convert_transcripts as ct
-import test.extract_pitch_midi as epm
-import test.normalization as norm
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import convert_transcripts as ct
+import extract_pitch_midi as epm
+import normalization as norm
+from volpiano import NOTE_MAPPING
 
 # note mapping
-note_mapping = {
-    '9': 55,  # G3
-    'a': 57,  # A3
-    'b': 59,  # B3
-    'c': 60,  # C4
-    'd': 62,  # D4
-    'e': 64,  # E4
-    'f': 65,  # F4
-    'g': 67,  # G4
-    'h': 69,  # A4
-    'j': 71,  # B4
-    'k': 72,  # C5
-    'l': 74,  # D5
-    'm': 76,  # E5
-    'n': 77,  # F5
-    'o': 79,  # G5
-    'p': 81,  # A5
-    'q': 83,  # B5
-    'r': 84,  # C6
-    's': 86,  # D6
-    '---4': 'end',
-    '---3': 'end',
-    '1--': 'start',
-    '---': 'word_pause',
-    '--': 'syllable_pause',
-    '-': 'neume_pause', 
-    '7': 'line_break',
-    '777': 'page_break',
-}
+note_mapping = NOTE_MAPPING
 
 origional_data_path = "dataset/gregorian_chant_origional.csv"
 midis_files_path = "dataset/gregorian_chant_pitch_midi"
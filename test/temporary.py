@@ -1,6 +1,11 @@
+import os
+import sys
 import pandas as pd
 import ast
 import math
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pitch_scale import CHANT_SCALE, PIANO_SCALE
+from windowing import parse_sequences
 
 def denormalize_pitch_sequence(normalized_sequence):
     """
@@ -12,12 +17,7 @@ def denormalize_pitch_sequence(normalized_sequence):
     Returns:
         denormalized_sequence (list): list of original pitch values (integers)
     """
-    min_pitch = 21
-    max_pitch = 108
-    range_pitch = max_pitch - min_pitch
-
-    denormalized_sequence = [int(round(normalized_value * range_pitch + min_pitch)) for normalized_value in normalized_sequence]
-    return denormalized_sequence
+    return PIANO_SCALE.inverse(normalized_sequence).tolist()
 
 def normalize_pitch_sequence(pitch_sequence):
     """
@@ -29,27 +29,41 @@ def normalize_pitch_sequence(pitch_sequence):
     Returns:
         normalized_sequence (list): list of normalized pitch values (floats)
     """
-    min_pitch = 55
-    max_pitch = 84
-    range_pitch = max_pitch - min_pitch
+    return CHANT_SCALE.forward(pitch_sequence).tolist()
+
+def denormalize_column(column):
+    """
+    Denormalize every stringified list in a column with one vectorized pass; other cells are kept as they are.
 
-    normalized_sequence = [(pitch - min_pitch) / range_pitch for pitch in pitch_sequence]
-    return normalized_sequence
+    Inputs:
+        column (Series): column of stringified lists of normalized pitch values
+
+    Returns:
+        Series: lists of original pitch values (integers)
+    """
+    values = column.tolist()
+    rows = [i for i, value in enumerate(values) if isinstance(value, str)]
+    if rows:
+        buffer, offsets = parse_sequences([values[i] for i in rows])
+        pitches = PIANO_SCALE.inverse(buffer).tolist()
+        for i, start, end in zip(rows, offsets[:-1], offsets[1:]):
+            values[i] = pitches[start:end]
+    return pd.Series(values, index=column.index, dtype=object)
 
 if __name__ == "__main__":
     # Read the dataset
     file_path = "dataset_test_filled(rough).csv"
     data = pd.read_csv(file_path)
 
-    data["pitch_sequence_original"] = data["normalized_pitch_sequence"].apply(lambda x: denormalize_pitch_sequence(ast.literal_eval(x)) if isinstance(x, str) and not pd.isna(x) else x)
-    data["input_pitch_original"] = data["input_pitch"].apply(lambda x: denormalize_pitch_sequence(ast.literal_eval(x)) if isinstance(x, str) and not pd.isna(x) else x)
+    data["pitch_sequence_original"] = denormalize_column(data["normalized_pitch_sequence"])
+    data["input_pitch_original"] = denormalize_column(data["input_pitch"])
 
     
     # Parse and denormalize the `option_2` to `option_10` columns
     for i in range(1, 11):
         column_name = f'option_{i}'
         new_column_name = f'{column_name}_original'
-        data[new_column_name] = data[column_name].apply(lambda x: denormalize_pitch_sequence(ast.literal_eval(x)) if isinstance(x, str) and not pd.isna(x) else x)
+        data[new_column_name] = denormalize_column(data[column_name])
 
     
     min_value = float('inf')
@@ -0,0 +1,50 @@
+import os
+import sys
+import numpy as np
+import pytest
+from sklearn.gaussian_process import GaussianProcessRegressor
+from sklearn.gaussian_process.kernels import RBF, ConstantKernel, WhiteKernel
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from gp_predictor import FastGPPredictor
+
+KERNELS = {
+    'rbf': RBF(length_scale=0.5),
+    'constant_rbf': ConstantKernel(2.0) * RBF(length_scale=0.5),
+    'rbf_white': RBF(length_scale=0.5) + WhiteKernel(noise_level=1e-3),
+}
+
+
+def fit_model(kernel, dtype=np.float64, n_train=200, window_size=8):
+    rng = np.random.default_rng(0)
+    X = rng.random((n_train, window_size))
+    y = np.sin(3 * X.sum(axis=1)) + 5
+    gp = GaussianProcessRegressor(kernel=kernel, alpha=1e-4, optimizer=None, normalize_y=True)
+    return gp.fit(X.astype(dtype), y), X
+
+
+@pytest.mark.parametrize('kernel', KERNELS.values(), ids=KERNELS.keys())
+@pytest.mark.parametrize('n_queries', [1, 50])
+@pytest.mark.parametrize('dtype, tolerance', [(np.float64, 1e-10), (np.float32, 1e-4)])
+def test_predict_matches_sklearn(kernel, n_queries, dtype, tolerance):
+    gp, X = fit_model(kernel)
+    queries = X[:n_queries] + np.random.default_rng(1).normal(0, 0.05, (n_queries, X.shape[1]))
+    y_mean, y_std = gp.predict(queries, return_std=True)
+    fast_mean, fast_std = FastGPPredictor.from_model(gp, dtype=dtype).predict(queries, return_std=True)
+    np.testing.assert_allclose(fast_mean, y_mean, rtol=0, atol=tolerance)
+    np.testing.assert_allclose(fast_std, y_std, rtol=0, atol=tolerance)
+
+
+def test_single_window_query():
+    gp, X = fit_model(KERNELS['rbf_white'])
+    fast_mean = FastGPPredictor.from_model(gp).predict(X[0])
+    np.testing.assert_allclose(fast_mean, gp.predict(X[:1]), rtol=0, atol=1e-10)
+
+
+def test_float32_model_windows_are_shared():
+    # A model trained on float32 windows is used in place for float32 forecasts, but copied for float64
+    gp, X = fit_model(KERNELS['rbf_white'], dtype=np.float32)
+    assert np.shares_memory(FastGPPredictor.from_model(gp, dtype=np.float32).X_train, gp.X_train_)
+    assert not np.shares_memory(FastGPPredictor.from_model(gp, dtype=np.float64).X_train, gp.X_train_)
+    y_mean = gp.predict(X[:20])
+    np.testing.assert_allclose(FastGPPredictor.from_model(gp, dtype=np.float32).predict(X[:20]), y_mean,
+                               rtol=0, atol=1e-4)
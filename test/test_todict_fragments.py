@@ -0,0 +1,22 @@
+import os
+import sys
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from todict_fragments import NGramTable
+
+
+def test_sparse_table_without_ngrams():
+    # Songs shorter than the order leave a sparse table with no n-grams, so every n-gram is a zero transition
+    table = NGramTable(7).fit([[1, 2, 3]])
+    assert not table.dense
+    np.testing.assert_array_equal(table.count(np.arange(5)), np.zeros(5, dtype=np.int64))
+    zero = np.concatenate(list(table.zero_transitions(min_note=9)))
+    assert len(zero) == 3 ** 7
+
+
+def test_sparse_counts_match_dense():
+    songs = [[1, 2, 3, 1, 2, 3, 4], [4, 3, 2, 1, 2, 3]]
+    dense = NGramTable(3).fit(songs)
+    sparse = NGramTable(3, dense_limit=0).fit(songs)
+    codes = np.arange(12 ** 3)
+    np.testing.assert_array_equal(sparse.count(codes), dense.count(codes))
@@ -1,5 +1,11 @@
+import argparse
 import numpy as np
 import sys
+from windowing import concat_sequences, window_starts
+
+N_NOTES = 12
+# Orders up to this many cells get a dense count tensor; higher orders are kept sparse
+DENSE_LIMIT = N_NOTES ** 6
 
 class Song:
     def __init__(self, name, pitches):
@@ -9,195 +15,214 @@ class Song:
     def __str__(self):
         return f"Name: {self._name}, Pitches: {self._pitches}"
 
+class NGramTable:
+    """
+    Order-generic n-gram transition counts over notes 0..n_notes-1.
+
+    Every n-gram is encoded as one base-n_notes integer (first note most significant), so counting
+    is a single bincount over the encoded n-grams of all songs. Orders whose n_notes**order cells
+    fit in dense_limit keep a dense count tensor; higher orders keep only the observed codes
+    and their counts, sorted, so memory grows with the data rather than with n_notes**order.
+    """
+    def __init__(self, order, n_notes=N_NOTES, dense_limit=DENSE_LIMIT):
+        if n_notes ** order >= 2 ** 63:
+            raise ValueError(f"Order {order} is too high to encode {n_notes} notes in int64")
+        self.order = order
+        self.n_notes = n_notes
+        self.dense = n_notes ** order <= dense_limit
+        self._powers = n_notes ** np.arange(order - 1, -1, -1, dtype=np.int64)
+
+    def encode(self, ngrams):
+        """Encode an array of n-grams, shape (..., order), as integer codes"""
+        return np.asarray(ngrams, dtype=np.int64) @ self._powers
+
+    def decode(self, codes):
+        """Decode integer codes back to n-grams, shape (len(codes), order)"""
+        return (np.asarray(codes, dtype=np.int64)[:, None] // self._powers) % self.n_notes
+
+    def fit(self, sequences):
+        """Count the n-grams of every sequence (list of note lists, or a (buffer, offsets) pair)"""
+        if isinstance(sequences, tuple):
+            buffer, offsets = sequences
+        else:
+            buffer, offsets = concat_sequences(sequences, dtype=np.int64)
+        buffer = np.asarray(buffer, dtype=np.int64)
+        if len(buffer) and (buffer.min() < 0 or buffer.max() >= self.n_notes):
+            raise ValueError(f"Notes must be in 0..{self.n_notes - 1}")
+
+        # Horner encoding of every n-gram that fits within its own sequence
+        starts = window_starts(offsets, self.order - 1)
+        codes = np.zeros(len(starts), dtype=np.int64)
+        for position in range(self.order):
+            codes = codes * self.n_notes + buffer[starts + position]
+
+        if self.dense:
+            self.counts_ = np.bincount(codes, minlength=self.n_notes ** self.order)
+        else:
+            self.codes_, self.counts_ = np.unique(codes, return_counts=True)
+        return self
+
+    def count(self, codes):
+        """Counts for an array of n-gram codes"""
+        codes = np.asarray(codes, dtype=np.int64)
+        if self.dense:
+            return self.counts_[codes]
+        if len(self.codes_) == 0:
+            # No sequence was long enough for a single n-gram
+            return np.zeros(len(codes), dtype=self.counts_.dtype)
+        index = np.minimum(np.searchsorted(self.codes_, codes), len(self.codes_) - 1)
+        found = self.codes_[index] == codes
+        return np.where(found, self.counts_[index], 0)
+
+    def probabilities(self):
+        """
+        Dense transition tensor P[a, b, ..., next], normalized over the last axis.
+
+        Contexts that never occur keep all-zero rows.
+        """
+        if not self.dense:
+            raise ValueError(f"Order {self.order} is stored sparse; use count() or zero_transitions() instead")
+        counts = self.counts_.reshape((-1, self.n_notes)).astype(np.float64)
+        totals = counts.sum(axis=1, keepdims=True)
+        totals[totals == 0] = 1
+        return (counts / totals).reshape((self.n_notes,) * self.order)
+
+    def zero_transitions(self, min_note=1, chunk_size=1 << 20):
+        """
+        Yield, in lexicographic order, the n-grams over notes min_note..n_notes-1 that never occur.
+
+        The candidate n-grams are enumerated in chunks and checked with vectorized masks, so memory
+        stays bounded by chunk_size even for orders whose full table would not fit.
+
+        Yields:
+        - int64 arrays of shape (k, order)
+        """
+        n_values = self.n_notes - min_note
+        n_candidates = n_values ** self.order
+        value_powers = n_values ** np.arange(self.order - 1, -1, -1, dtype=np.int64)
+        for start in range(0, n_candidates, chunk_size):
+            index = np.arange(start, min(start + chunk_size, n_candidates), dtype=np.int64)
+            ngrams = (index[:, None] // value_powers) % n_values + min_note
+            zero = ngrams[self.count(self.encode(ngrams)) == 0]
+            if len(zero):
+                yield zero
+
+def calculate_probabilities(data, order):
+    """Transition probabilities P[a, b, ..., next] of the given order as a dense NumPy tensor"""
+    return NGramTable(order).fit(data).probabilities()
+
 def calculate_probabilities2(data):
-    probabilities = []
-    for x in range(12):
-        temp = [0]*12
-        probabilities.append(temp)
-    for x in range(len(data)):
-        for y in range(len(data[x])-1):
-            probabilities[data[x][y]][data[x][y+1]] += 1
-    for x in range(len(probabilities)):
-        temp_sum = sum(probabilities[x])
-        if temp_sum == 0:
-            temp_sum = 1
-        for y in range(len(probabilities[x])):
-            probabilities[x][y] /= temp_sum
-    return probabilities
+    return calculate_probabilities(data, 2)
 
 def calculate_probabilities3(data):
-    probabilities = []
-    for x in range(12):
-        temp_x = []
-        for y in range(12):
-            temp_y = [0]*12
-            temp_x.append(temp_y)
-        probabilities.append(temp_x)
-        
-    for x in range(len(data)):
-        for y in range(len(data[x])-2):
-            probabilities[data[x][y]][data[x][y+1]][data[x][y+2]] += 1
-    
-    for x in range(len(probabilities)):
-        for y in range(len(probabilities[x])):
-            temp_sum = sum(probabilities[x][y])
-            if temp_sum == 0:
-                temp_sum = 1
-            for z in range(len(probabilities[x][y])):
-                probabilities[x][y][z] /= temp_sum
-                
-    return probabilities
-
+    return calculate_probabilities(data, 3)
 
 def calculate_probabilities4(data):
-    probabilities = []
-    for x in range(12):
-        temp_x = []
-        for y in range(12):
-            temp_y = []
-            for z in range(12):
-                temp_z = [0]*12
-                temp_y.append(temp_z)
-            temp_x.append(temp_y)
-        probabilities.append(temp_x)
-        
-    for x in range(len(data)):
-        for y in range(len(data[x])-3):
-            probabilities[data[x][y]][data[x][y+1]][data[x][y+2]][data[x][y+3]] += 1
-    
-    for x in range(len(probabilities)):
-        for y in range(len(probabilities[x])):
-            for z in range(len(probabilities[x][y])):
-                temp_sum = sum(probabilities[x][y][z])
-                if temp_sum == 0:
-                    temp_sum = 1
-                for w in range(len(probabilities[x][y][z])):
-                    probabilities[x][y][z][w] /= temp_sum
-                
-    return probabilities
+    return calculate_probabilities(data, 4)
 
 def calculate_probabilities5(data):
-    probabilities = []
-    for a in range(12):
-        temp_a = []
-        for b in range(12):
-            temp_b = []
-            for c in range(12):
-                temp_c = []
-                for d in range(12):
-                    temp_d = [0] * 12
-                    temp_c.append(temp_d)
-                temp_b.append(temp_c)
-            temp_a.append(temp_b)
-        probabilities.append(temp_a)
-        
-    for sequence in data:
-        for i in range(len(sequence) - 4):
-            a, b, c, d, e = sequence[i], sequence[i+1], sequence[i+2], sequence[i+3], sequence[i+4]
-            probabilities[a][b][c][d][e] += 1
-    
-    for a in range(12):
-        for b in range(12):
-            for c in range(12):
-                for d in range(12):
-                    temp_sum = sum(probabilities[a][b][c][d])
-                    if temp_sum == 0:
-                        temp_sum = 1
-                    for e in range(12):
-                        probabilities[a][b][c][d][e] /= temp_sum
-                        
-    return probabilities
-
+    return calculate_probabilities(data, 5)
 
 def calculate_probabilities6(data):
-    probabilities = []
-    for a in range(12):
-        temp_a = []
-        for b in range(12):
-            temp_b = []
-            for c in range(12):
-                temp_c = []
-                for d in range(12):
-                    temp_d = []
-                    for e in range(12):
-                        temp_e = [0] * 12
-                        temp_d.append(temp_e)
-                    temp_c.append(temp_d)
-                temp_b.append(temp_c)
-            temp_a.append(temp_b)
-        probabilities.append(temp_a)
-        
-    for sequence in data:
-        for i in range(len(sequence) - 5):
-            a, b, c, d, e, f = sequence[i], sequence[i+1], sequence[i+2], sequence[i+3], sequence[i+4], sequence[i+5]
-            probabilities[a][b][c][d][e][f] += 1
-    
-    for a in range(12):
-        for b in range(12):
-            for c in range(12):
-                for d in range(12):
-                    for e in range(12):
-                        temp_sum = sum(probabilities[a][b][c][d][e])
-                        if temp_sum == 0:
-                            temp_sum = 1
-                        for f in range(12):
-                            probabilities[a][b][c][d][e][f] /= temp_sum
-                        
-    return probabilities
-
-song_list = []
-
-with open("q1_songs.txt", "r") as f:
-    for line in f:
-        name, pitches_str = line.strip().split(":")
-        pitches_list = [int(p) for p in pitches_str.split(",")]
-        temp = Song(name, pitches_list)
-        song_list.append(temp)
-
-song_list_pitches = [x._pitches for x in song_list]
-
-probs2 = calculate_probabilities2(song_list_pitches)
-probs3 = calculate_probabilities3(song_list_pitches)
-probs4 = calculate_probabilities4(song_list_pitches)
-probs5 = calculate_probabilities5(song_list_pitches)
-probs6 = calculate_probabilities6(song_list_pitches)
-
-for a in range(len(probs2)):
-    for b in range(len(probs2[a])):
-        if probs2[a][b] == 0.0 and a != 0 and b != 0:
-            print("constraint forall(i in 1..n-1)(z[i] = " + str(a) + " -> z[i+1] != " + str(b) +");")
-
-for a in range(len(probs3)):
-    for b in range(len(probs3[a])):
-        for c in range(len(probs3[a][b])):
-            if probs3[a][b][c] == 0.0 and a != 0 and b != 0 and c != 0:
-                print("constraint forall(i in 1..n-2)(z[i] = " + str(a) + " /\ z[i+1] = " + str(b) + " -> z[i+2] != " + str(c) +");")
-
-
-for a in range(len(probs4)):
-    for b in range(len(probs4[a])):
-        for c in range(len(probs4[a][b])):
-            for d in range(len(probs4[a][b][c])):
-                if probs4[a][b][c][d] == 0.0 and a != 0 and b != 0 and c != 0 and d != 0:
-                    print("constraint forall(i in 1..n-3)(z[i] = " + str(a) + " /\ z[i+1] = " + str(b) + " /\ z[i+2] = " + str(c) + " -> z[i+3] != " + str(d) +");")
-
-for a in range(len(probs5)):
-    for b in range(len(probs5[a])):
-        for c in range(len(probs5[a][b])):
-            for d in range(len(probs5[a][b][c])):
-                for e in range(len(probs5[a][b][c][d])):
-                    if probs5[a][b][c][d][e] == 0.0 and a != 0 and b != 0 and c != 0 and d != 0 and e != 0:
-                        print("constraint forall(i in 1..n-4)(z[i] = " + str(a) + " /\ z[i+1] = " + str(b) + " /\ z[i+2] = " + str(c) + " /\ z[i+3] = " + str(d) + " -> z[i+4] != " + str(e) +");")
-
-for a in range(len(probs6)):
-    for b in range(len(probs6[a])):
-        for c in range(len(probs6[a][b])):
-            for d in range(len(probs6[a][b][c])):
-                for e in range(len(probs6[a][b][c][d])):
-                    for f in range(len(probs6[a][b][c][d][e])):
-                        if probs6[a][b][c][d][e][f] == 0.0 and a != 0 and b != 0 and c != 0 and d != 0 and e != 0 and f != 0:
-                            print("constraint forall(i in 1..n-5)(z[i] = " + str(a) + " /\ z[i+1] = " + str(b) + " /\ z[i+2] = " + str(c) + " /\ z[i+3] = " + str(d) + " /\ z[i+4] = " + str(e) + " -> z[i+5] != " + str(f) + ");")
-
+    return calculate_probabilities(data, 6)
+
+def format_constraints(ngrams):
+    """Format zero-probability n-grams as MiniZinc constraints forbidding them in z"""
+    order = ngrams.shape[1]
+    context = " /\\ ".join(["z[i] = %d"] + [f"z[i+{k}] = %d" for k in range(1, order - 1)])
+    prefix_template = f"constraint forall(i in 1..n-{order - 1})({context} -> z[i+{order - 1}] != "
+    if len(ngrams) == 0:
+        return []
+
+    # Rows sharing a context share their prefix, so each distinct context is formatted only once
+    new_context = np.ones(len(ngrams), dtype=bool)
+    new_context[1:] = np.any(ngrams[1:, :-1] != ngrams[:-1, :-1], axis=1)
+    starts = np.flatnonzero(new_context)
+    prefixes = np.empty(len(starts), dtype=object)
+    prefixes[:] = [prefix_template % row for row in map(tuple, ngrams[starts, :-1].tolist())]
+    prefixes = np.repeat(prefixes, np.diff(np.append(starts, len(ngrams)))).tolist()
+
+    suffixes = [f"{note});" for note in range(int(ngrams[:, -1].max()) + 1)]
+    return [prefix + suffixes[note] for prefix, note in zip(prefixes, ngrams[:, -1].tolist())]
+
+def format_table_rows(ngrams):
+    """Format n-grams as the comma-separated rows of a MiniZinc 2D array literal"""
+    template = ", ".join(["%d"] * ngrams.shape[1])
+    return [template % ngram for ngram in map(tuple, ngrams.tolist())]
+
+def write_minizinc_constraints(tables, output, constraint_format="forall", chunk_size=1 << 20):
+    """
+    Write MiniZinc constraints that forbid the zero-count n-grams of each table in the sequence z.
+
+    Each chunk of n-grams is formatted and written with a single write() call through a 1 MB
+    buffer, so large orders are limited by I/O rather than by per-line Python calls.
+
+    Args:
+    - tables: Iterable of fitted NGramTable objects
+    - output: Output path, or an open text file (e.g. sys.stdout)
+    - constraint_format: 'forall' writes one constraint per forbidden n-gram; 'table' writes one
+      forbidden-tuple array per order plus a single `not table(...)` constraint over every position
+    - chunk_size: Number of candidate n-grams checked and formatted per chunk
+
+    Returns:
+    - number of forbidden n-grams written
+    """
+    if constraint_format not in ("forall", "table"):
+        raise ValueError(f"Unknown constraint format: {constraint_format}")
+    if isinstance(output, str):
+        with open(output, "w", buffering=1 << 20) as f:
+            return write_minizinc_constraints(tables, f, constraint_format, chunk_size)
+
+    total = 0
+    for table in tables:
+        order = table.order
+        if constraint_format == "forall":
+            for ngrams in table.zero_transitions(chunk_size=chunk_size):
+                output.write("\n".join(format_constraints(ngrams)) + "\n")
+                total += len(ngrams)
+            continue
+
+        n_rows = 0
+        for ngrams in table.zero_transitions(chunk_size=chunk_size):
+            if n_rows == 0:
+                output.write(f"array[int, 1..{order}] of int: forbid_{order} = [|\n  ")
+            else:
+                output.write("\n  | ")
+            output.write("\n  | ".join(format_table_rows(ngrams)))
+            n_rows += len(ngrams)
+        if n_rows:
+            variables = ", ".join(["z[i]"] + [f"z[i+{k}]" for k in range(1, order)])
+            output.write("\n  |];\n")
+            output.write(f"constraint forall(i in 1..n-{order - 1})(not table([{variables}], forbid_{order}));\n")
+        total += n_rows
+    return total
+
+def read_songs(path):
+    song_list = []
+    with open(path, "r") as f:
+        for line in f:
+            name, pitches_str = line.strip().split(":")
+            pitches_list = [int(p) for p in pitches_str.split(",")]
+            temp = Song(name, pitches_list)
+            song_list.append(temp)
+    return song_list
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write MiniZinc constraints for the note n-grams that never occur in the songs.")
+    parser.add_argument("--songs", default="q1_songs.txt", help="File with one 'name:pitch,pitch,...' song per line.")
+    parser.add_argument("--max-order", type=int, default=6, help="Highest n-gram order to emit constraints for.")
+    parser.add_argument("--output", default=None, help="Output .mzn file (default: stdout).")
+    parser.add_argument("--format", choices=["forall", "table"], default="forall",
+                        help="One forall constraint per forbidden n-gram, or one table constraint per order.")
+    args = parser.parse_args()
+
+    song_list = read_songs(args.songs)
+    song_list_pitches = [x._pitches for x in song_list]
+
+    tables = (NGramTable(order).fit(song_list_pitches) for order in range(2, args.max_order + 1))
+    total = write_minizinc_constraints(tables, args.output or sys.stdout, args.format)
+    if args.output:
+        print(f"Wrote {total} forbidden n-grams to {args.output}")
 
 
 '''
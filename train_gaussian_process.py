@@ -1,10 +1,20 @@
+import argparse
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import pandas as pd
 from joblib import dump, load
 import os
 from sklearn.gaussian_process import GaussianProcessRegressor
-from sklearn.gaussian_process.kernels import RBF
-from sklearn.utils import shuffle
+from sklearn.utils import check_random_state
+from committee_gp import CommitteeGaussianProcessRegressor
+from dataset_io import load_dataset
+from feature_gp import FeatureGaussianProcessRegressor
+from gp_predictor import make_predictor
+from kernel_tuning import rbf_kernel, tune_kernel
+from local_gp import LocalGaussianProcessRegressor
+from pitch_scale import CHANT_SCALE, PitchNormalizer
+from sparse_gp import SparseGaussianProcessRegressor
+from windowing import LazyWindows, lazy_windows, parse_sequences, sliding_windows
 
 
 class MelodySelector:
@@ -13,65 +23,182 @@ class MelodySelector:
     
     The model is trained on a dataset of melodies and can be used to select the best continuation of a given melody sequence from a set of options.
     """
-    def __init__(self, window_size=32, batch_size=200, model_path='models/gp_5epoch.joblib'):
-        # Define the GP kernel with specific length scale bounds, higher is more flexible
-        kernel = RBF(length_scale=0.2, length_scale_bounds=(1e-4, 1e2))
-
-        # Initialize the Gaussian Process Regressor
-        self.gp = GaussianProcessRegressor(
-            kernel=kernel,
-            alpha=1e-9,
-            random_state=42,
-            optimizer='fmin_l_bfgs_b',
-            n_restarts_optimizer=5,
-            normalize_y=True,
-        )
-        # Set the window size and batch size
+    def __init__(self, window_size=32, batch_size=200, model_path='models/gp_5epoch.joblib', backend='exact',
+                 n_inducing=500, n_neighbors=64, local_index='cluster', combine='rbcm', workers=1,
+                 n_features=1000, kernel=None, pitch_normalizer=None, dtype=np.float64):
+        # Set the window size, batch size and the model backend
         self.window_size = window_size
         self.batch_size = batch_size
         self.model_path = model_path
+        self.backend = backend
+        self.n_inducing = n_inducing
+        self.n_neighbors = n_neighbors
+        self.local_index = local_index
+        self.combine = combine
+        self.workers = workers
+        self.n_features = n_features
+        # A tuned kernel (see kernel_tuning.tune_kernel) is used as is, without per-fit optimization
+        self.kernel = kernel
+        # Compute precision of the windows and of prediction; np.float32 halves the stored windows,
+        # which float32 forecasts then use in place, while the Cholesky factors stay in float64
+        self.dtype = np.dtype(dtype)
+        # Pitch scale of the training data; saved with the model so inputs are normalized the same way
+        self.pitch_normalizer = pitch_normalizer or PitchNormalizer.from_dict(CHANT_SCALE.to_dict())
+
+        self.gp = self._build_model()
+        self._predictor = None
+
+    def _build_model(self):
+        """Build the regressor for the selected backend"""
+        if self.kernel is not None:
+            # Hyperparameters were tuned once up front, so the fits skip the optimizer
+            kernel, optimizer = self.kernel, None
+        else:
+            # Define the GP kernel with specific length scale bounds, higher is more flexible
+            kernel, optimizer = rbf_kernel(), 'fmin_l_bfgs_b'
+
+        if self.backend == 'exact':
+            # Initialize the Gaussian Process Regressor
+            return GaussianProcessRegressor(
+                kernel=kernel,
+                alpha=1e-9,
+                random_state=42,
+                optimizer=optimizer,
+                n_restarts_optimizer=5,
+                normalize_y=True,
+            )
+        if self.backend == 'sparse':
+            # Sparse GP over inducing windows, trained on every window at once
+            return SparseGaussianProcessRegressor(
+                kernel=kernel,
+                n_inducing=self.n_inducing,
+                alpha=1e-6,
+                random_state=42,
+                optimizer=optimizer,
+                n_restarts_optimizer=5,
+                normalize_y=True,
+            )
+        if self.backend == 'local':
+            # Local GP experts over the k nearest windows, every window stays available at query time
+            return LocalGaussianProcessRegressor(
+                kernel=kernel,
+                n_neighbors=self.n_neighbors,
+                index=self.local_index,
+                alpha=1e-6,
+                random_state=42,
+                optimizer=optimizer,
+                n_restarts_optimizer=5,
+                normalize_y=True,
+            )
+        if self.backend == 'committee':
+            # One exact GP per shard of batch_size windows, fitted in parallel and combined at prediction
+            return CommitteeGaussianProcessRegressor(
+                kernel=kernel,
+                shard_size=self.batch_size,
+                combine=self.combine,
+                alpha=1e-9,
+                random_state=42,
+                optimizer=optimizer,
+                n_restarts_optimizer=5,
+                normalize_y=True,
+                workers=self.workers,
+            )
+        if self.backend in ('rff', 'nystrom'):
+            # Bayesian linear regression on random Fourier or Nystrom features, streamed over every window
+            return FeatureGaussianProcessRegressor(
+                kernel=kernel,
+                n_features=self.n_features,
+                features=self.backend,
+                alpha=1e-4,
+                random_state=42,
+                optimizer=optimizer,
+                n_restarts_optimizer=5,
+                normalize_y=True,
+            )
+        raise ValueError(f"Unknown backend: {self.backend}")
         
-    def prepare_training_data(self, data_frame):
-        # Convert 'Normalized Pitch' data into a numpy array of floats
-        # data_frame['Data'] = data_frame['normalized_pitch_sequence'].apply(lambda x: np.array([float(i) for i in x.strip('[]').split(',')]))
-        data_frame['Data'] = data_frame['normalized_pitch_sequence'].apply(
-            lambda x: np.array([round(float(i), 4) for i in x.strip('[]').split(',')])
-        )
-
-        # Initialize the training data
-        X_train = []
-        y_train = []
-
-        # Loop through each row in the data frame
-        for _, row in data_frame.iterrows():
-            sequence = row['Data']
-            # If the sequence is longer than the window size, we can apply a sliding window
-            if len(sequence) > self.window_size:
-                for i in range(0, len(sequence) - self.window_size):
-                    # Add the windowed sequence to X_train and the next value to y_train
-                    X_train.append(sequence[i:i + self.window_size])
-                    y_train.append(sequence[i + self.window_size])
-
-        # Convert the lists to numpy arrays for training
-        return np.array(X_train), np.array(y_train)
-    
+    def set_kernel(self, kernel):
+        """Use a tuned kernel for every following fit, with the optimizer turned off"""
+        self.kernel = kernel
+        self.gp = self._build_model()
+        self._predictor = None
+
+    def prepare_training_data(self, data_frame, dtype=None, lazy=False, mmap_dir=None):
+        # Parse the 'normalized_pitch_sequence' column into one flat buffer of notes plus row offsets
+        buffer, offsets = parse_sequences(data_frame['normalized_pitch_sequence'])
+        return self.prepare_training_windows(buffer, offsets, dtype=dtype, lazy=lazy, mmap_dir=mmap_dir)
+
+    def prepare_training_windows(self, buffer, offsets, dtype=None, lazy=False, mmap_dir=None):
+        """
+        Build the sliding-window training pairs from a flat note buffer.
+
+        By default X_train is a dense (n_windows, window_size) array. With lazy=True it is a LazyWindows
+        that only keeps the buffer and the window starts, and with mmap_dir those are also written to
+        disk and memory-mapped back, so windows are read from the mmap as training touches them.
+        The windows and targets are in `dtype`, by default the selector's compute precision.
+        """
+        dtype = self.dtype if dtype is None else dtype
+        # Round the notes to 4 decimals as before
+        buffer = np.round(np.asarray(buffer, dtype=np.float64), 4)
+
+        if lazy or mmap_dir is not None:
+            X_train, y_train = lazy_windows(buffer, offsets, self.window_size, dtype=dtype)
+            if mmap_dir is not None:
+                X_train.save(mmap_dir)
+                X_train = LazyWindows.load(mmap_dir, dtype=dtype)
+            return X_train, y_train
+
+        # Every sequence longer than the window size yields len - window_size sliding windows,
+        # taken as strided views over the buffer and copied once into X_train
+        X_train, y_train = sliding_windows(buffer, offsets, self.window_size, dtype=dtype)
+        return X_train, y_train
 
     def train_model(self, X_train, y_train):
+        if self.backend == 'sparse':
+            # The sparse GP learns from every window in a single pass
+            print(f"Fitting sparse GP with {self.n_inducing} inducing windows on {len(X_train)} windows")
+            self.gp.fit(X_train, y_train)
+        elif self.backend == 'local':
+            # The local experts index every window in a single pass
+            print(f"Indexing {len(X_train)} windows for local GPs over {self.n_neighbors} neighbours ({self.local_index})")
+            self.gp.fit(X_train, y_train)
+        elif self.backend == 'committee':
+            # Every window goes to exactly one expert; the experts are fitted on a process pool
+            print(f"Fitting {-(-len(X_train) // self.batch_size)} GP experts on {len(X_train)} windows with {self.workers} workers")
+            self.gp.fit(X_train, y_train)
+        elif self.backend in ('rff', 'nystrom'):
+            # The feature-space posterior is accumulated over every window in a single streaming pass
+            print(f"Fitting {self.backend} GP with {self.n_features} features on {len(X_train)} windows")
+            self.gp.fit(X_train, y_train)
+        else:
+            self._train_batches(X_train, y_train)
+        self._predictor = None
+
+        # Save the model after training, together with the pitch scale it was trained on
+        print("\nSaving model...")
+        self.gp.pitch_normalizer_ = self.pitch_normalizer.to_dict()
+        dump(self.gp, self.model_path)
+        print(f"Model saved to {self.model_path}")
+
+    def _train_batches(self, X_train, y_train):
         # Number of epochs for training
         n_epochs = 30
 
+        # Shuffle an index array rather than the data, so lazily loaded windows are only read batch by batch
+        order = np.arange(len(X_train))
+
         for epoch in range(n_epochs):
 
             print(f"Epoch {epoch + 1}/{n_epochs}")
 
             # Shuffle the training data before each epoch
-            X_train, y_train = shuffle(X_train, y_train, random_state=42)
+            order = order[check_random_state(42).permutation(len(order))]
             
             # Loop through the training data in batches
             for start in range(0, len(X_train), self.batch_size):
                 end = start + self.batch_size
-                batch_X = X_train[start:end]
-                batch_y = y_train[start:end]
+                batch_X = X_train[order[start:end]]
+                batch_y = y_train[order[start:end]]
                 
                 # Fit the GP model to the current batch
                 self.gp.fit(batch_X, batch_y)
@@ -81,90 +208,158 @@ class MelodySelector:
                 if current_batch_size % 100 == 0:
                     print(f"Batch Completed: {current_batch_size}/{len(X_train) // self.batch_size + 1}")
 
-        # Save the model after training            
-        print("\nSaving model...")
-        dump(self.gp, self.model_path)
-        print(f"Model saved to {self.model_path}")
+    def load_model(self, mmap_mode=None, verbose=True):
+        """
+        Load a previously trained model if it exists.
 
-    def load_model(self):
-        """Load a previously trained model if it exists"""
+        With mmap_mode='r' the fitted arrays (training windows, alpha_, L_) are memory-mapped
+        from the joblib file instead of copied, so several processes share one read-only copy.
+        """
         if os.path.exists(self.model_path):
-            print(f"Loading existing model from {self.model_path}")
-            self.gp = load(self.model_path)
+            if verbose:
+                print(f"Loading existing model from {self.model_path}")
+            self.gp = load(self.model_path, mmap_mode=mmap_mode)
+            self._predictor = None
+            # Models saved before the scale was stored were all trained on the chant scale
+            self.pitch_normalizer = PitchNormalizer.from_dict(getattr(self.gp, 'pitch_normalizer_', CHANT_SCALE.to_dict()))
             return True
         return False
 
-    def select_best_option(self, test_input, options):
-        # print("Option Evaluation:")
-        option_scores = []
-        
-        # Loop through each option to evaluate its performance
-        for idx, option in enumerate(options):
-            # Initialize the sliding window with the last `window_size` values of the test input sequence
-            current_window = test_input[-self.window_size:].copy()
-            predictions = []
-            prediction_stds = []
-            
-            # Predict each step of the option sequence
-            for step in range(len(option)):
-                window_input = current_window.reshape(1, -1)
-                pred_mean, pred_std = self.gp.predict(window_input, return_std=True)
-                
-                predictions.append(pred_mean[0])
-                prediction_stds.append(pred_std[0])
-                
-                # Update the sliding window with the predicted value, 1 per step
-                current_window = np.roll(current_window, -1)
-                current_window[-1] = pred_mean[0]
-            
-            predictions = np.array(predictions)
-            prediction_stds = np.array(prediction_stds)
-            
-            # 1. prediction_error between the option and the predictions
-            prediction_error = np.mean((predictions - option) ** 2)
-            
-            # 2. Variance difference between predicted and actual sequences
-            variance_diff = abs(np.var(option) - np.var(predictions))
-            
-            # 3. Contour similarity (difference in pitch changes)
-            pred_contour = np.diff(predictions)
-            option_contour = np.diff(option)
-            contour_similarity = np.mean((pred_contour - option_contour) ** 2)
-            
-            # 4. Confidence interval score (how many predictions fall within the 95% confidence interval)
-            confidence_interval_width = 1.96 * prediction_stds
-            lower_bound = predictions - confidence_interval_width
-            upper_bound = predictions + confidence_interval_width
-            in_interval = np.logical_and(option >= lower_bound, option <= upper_bound)
-            confidence_score = 1.0 - np.mean(in_interval)
-            
-            # New Feature 1: Moving Average (MA) Similarity
-            option_ma = np.convolve(option, np.ones(3) / 3, mode='valid')
-            pred_ma = np.convolve(predictions, np.ones(3)/ 3, mode='valid')
-            ma_similarity = np.mean((option_ma - pred_ma) ** 2)
-            
-            combined_score = (
-                ma_similarity
-            )
+    @property
+    def predictor(self):
+        """
+        Predictor used for forecasting, built once from the fitted model.
 
-            option_scores.append(combined_score)
-            
-            # Set the print options for numpy arrays
-            np.set_printoptions(suppress=True, precision=6)
-        
-        best_option_index = np.argmin(option_scores)
-        
-        return best_option_index
+        Exact RBF models get a FastGPPredictor that skips sklearn's per-call overhead; any
+        other model (e.g. the sparse backend) is used as is.
+        """
+        if self._predictor is None:
+            self._predictor = make_predictor(self.gp, dtype=self.dtype)
+        return self._predictor
+
+    def rollout(self, test_inputs, n_steps, return_std=False):
+        """
+        Forecast `n_steps` notes for a batch of inputs, feeding each prediction back into the window.
+
+        All test cases are rolled out in lockstep, so there is one predict call per step for the whole batch.
+
+        Args:
+        - test_inputs: Input sequences, shape (n_cases, input_length) with input_length >= window_size
+        - n_steps: Number of notes to forecast
+        - return_std: Whether to also return the predictive standard deviations
+
+        Returns:
+        - predictions, shape (n_cases, n_steps), and their standard deviations if return_std is True
+        """
+        # Keep the inputs' last `window_size` notes and the forecast in one note buffer; the window at
+        # each step is a view into it, so nothing is shifted or copied between steps
+        test_inputs = np.atleast_2d(test_inputs)
+        notes = np.empty((len(test_inputs), self.window_size + n_steps), dtype=self.dtype)
+        notes[:, :self.window_size] = test_inputs[:, -self.window_size:]
+        predictions = notes[:, self.window_size:]
+        prediction_stds = np.empty((len(notes), n_steps), dtype=self.dtype)
+
+        for step in range(n_steps):
+            windows = notes[:, step:step + self.window_size]
+            if return_std:
+                predictions[:, step], prediction_stds[:, step] = self.predictor.predict(windows, return_std=True)
+            else:
+                predictions[:, step] = self.predictor.predict(windows)
+
+        if return_std:
+            return predictions, prediction_stds
+        return predictions
+
+    def score_options(self, predictions, options):
+        """
+        Score every option against the forecast; lower is better.
+
+        Args:
+        - predictions: Forecast notes, shape (n_cases, n_steps)
+        - options: Candidate continuations, shape (n_cases, n_options, n_steps)
+
+        Returns:
+        - scores, shape (n_cases, n_options)
+        """
+        predictions = np.asarray(predictions)[:, None, :]
+        options = np.asarray(options, dtype=self.dtype)
+
+        # Moving Average (MA) similarity: mean squared difference of the 3-note moving averages
+        option_ma = sliding_window_view(options, 3, axis=-1).mean(axis=-1)
+        pred_ma = sliding_window_view(predictions, 3, axis=-1).mean(axis=-1)
+        return np.mean((option_ma - pred_ma) ** 2, axis=-1)
+
+    def select_best_options(self, test_inputs, options):
+        """
+        Select the best option for a batch of test cases.
+
+        The rollout does not depend on the option, so it is computed once per test case and
+        all options are scored against it in one vectorized pass.
+
+        Args:
+        - test_inputs: Input sequences, shape (n_cases, input_length)
+        - options: Candidate continuations, shape (n_cases, n_options, n_steps)
+
+        Returns:
+        - Index of the best option for each test case, shape (n_cases,)
+        """
+        options = np.asarray(options, dtype=self.dtype)
+        predictions = self.rollout(test_inputs, options.shape[-1])
+        return np.argmin(self.score_options(predictions, options), axis=1)
+
+    def select_best_option(self, test_input, options):
+        """Select the best option for a single test case"""
+        return self.select_best_options(np.asarray(test_input)[None, :], np.asarray(options)[None, :, :])[0]
 
 def main():
-    # read training data
-    training_data = pd.read_csv('dataset/dataset_train.csv')
-    
+    parser = argparse.ArgumentParser(description="Train the Gaussian Process melody model.")
+    parser.add_argument('--backend', choices=['exact', 'sparse', 'local', 'committee', 'rff', 'nystrom'], default='exact',
+                        help='Model backend to train. committee keeps float32 Cholesky inverses of '
+                             'n_windows x 200 x 4 bytes (about 1.1 GB for 1.4M windows) and touches all of them per query.')
+    parser.add_argument('--n-inducing', type=int, default=500, help='Number of inducing windows for the sparse backend.')
+    parser.add_argument('--n-neighbors', type=int, default=64, help='Training windows per local GP for the local backend.')
+    parser.add_argument('--local-index', choices=['kdtree', 'balltree', 'cluster'], default='cluster',
+                        help='Neighbour search of the local backend: exact kNN per query, or cached experts over a balanced partition.')
+    parser.add_argument('--combine', choices=['rbcm', 'bcm', 'gpoe', 'poe'], default='rbcm',
+                        help='How the committee backend combines its experts.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes for fitting the committee experts and the tuning restarts.')
+    parser.add_argument('--n-features', type=int, default=1000, help='Number of features for the rff and nystrom backends.')
+    parser.add_argument('--tune', action='store_true',
+                        help='Tune the RBF length scale and noise once on a subsample, then fit without the optimizer.')
+    parser.add_argument('--tune-subset', type=int, default=2000, help='Number of windows the kernel is tuned on.')
+    parser.add_argument('--kernel-cache', default='models/kernel_cache.json', help='Cache of tuned kernels by dataset hash.')
+    parser.add_argument('--model-path', default='models/gp_5epoch.joblib', help='Where to save the trained model.')
+    parser.add_argument('--train-data', default='dataset/dataset_train.csv', help='Training set, CSV or binary .npz.')
+    parser.add_argument('--mmap-dir', default=None, help='Keep the training windows memory-mapped in this directory.')
+    parser.add_argument('--dtype', choices=['float64', 'float32'], default='float64',
+                        help='Precision of the stored training windows; float32 halves their memory and '
+                             'lets float32 forecasts use them without a copy.')
+    args = parser.parse_args()
+
     # initialize the melody selector
-    melody_selector = MelodySelector()
+    melody_selector = MelodySelector(model_path=args.model_path, backend=args.backend, n_inducing=args.n_inducing,
+                                     n_neighbors=args.n_neighbors, local_index=args.local_index,
+                                     combine=args.combine, workers=args.workers, n_features=args.n_features,
+                                     dtype=args.dtype)
     
-    # prepare training data
-    X_train, y_train = melody_selector.prepare_training_data(training_data)
+    # read and prepare training data
+    if args.train_data.endswith('.npz'):
+        training_data = load_dataset(args.train_data)
+        if 'normalized' not in training_data:
+            # Raw MIDI pitches (e.g. from ingest_volpiano.py) are normalized here in one vectorized pass
+            training_data['normalized'] = melody_selector.pitch_normalizer.forward(training_data['pitches'])
+        X_train, y_train = melody_selector.prepare_training_windows(training_data['normalized'], training_data['offsets'],
+                                                                    mmap_dir=args.mmap_dir)
+    else:
+        training_data = pd.read_csv(args.train_data)
+        X_train, y_train = melody_selector.prepare_training_data(training_data, mmap_dir=args.mmap_dir)
+
+    if args.tune:
+        # One parallel optimization on a subsample (or a cache hit) replaces the per-batch restarts
+        # Tuned with the jitter of the selected backend, which is also part of the cache key
+        melody_selector.set_kernel(tune_kernel(X_train, y_train, n_subset=args.tune_subset, alpha=melody_selector.gp.alpha,
+                                               workers=args.workers, cache_path=args.kernel_cache))
     
     # train the model
     melody_selector.train_model(X_train, y_train)
@@ -0,0 +1,181 @@
+import re
+import numpy as np
+
+# note mapping
+NOTE_MAPPING = {
+    '9': 55,  # G3
+    'a': 57,  # A3
+    'b': 59,  # B3
+    'c': 60,  # C4
+    'd': 62,  # D4
+    'e': 64,  # E4
+    'f': 65,  # F4
+    'g': 67,  # G4
+    'h': 69,  # A4
+    'j': 71,  # B4
+    'k': 72,  # C5
+    'l': 74,  # D5
+    'm': 76,  # E5
+    'n': 77,  # F5
+    'o': 79,  # G5
+    'p': 81,  # A5
+    'q': 83,  # B5
+    'r': 84,  # C6
+    's': 86,  # D6
+    '---4': 'end',
+    '---3': 'end',
+    '1--': 'start',
+    '---': 'word_pause',
+    '--': 'syllable_pause',
+    '-': 'neume_pause',
+    '7': 'line_break',
+    '777': 'page_break',
+}
+
+# Melodies containing this marker are incomplete and are skipped
+SKIP_MARKER = '6------6'
+
+# Runs of up to three dashes are one pause token, every other character is its own token
+TOKEN_PATTERN = re.compile(r'-{1,3}|.', re.DOTALL)
+PAUSE_NAMES = {'---': 'word_pause', '--': 'syllable_pause', '-': 'neume_pause'}
+
+# Separator between melodies when a whole chunk is translated at once; it maps to SEPARATOR_CODE
+SEPARATOR = '\x00'
+SEPARATOR_CODE = 255
+
+
+class VolpianoTokenizer:
+    """
+    Table-driven Volpiano tokenizer.
+
+    Pitches are extracted with a single bytes.translate call that maps every note character
+    (upper or lower case) to its MIDI pitch and deletes everything else, which gives the same
+    result as scanning the melody character by character with the note mapping.
+    """
+    def __init__(self, note_mapping=NOTE_MAPPING):
+        self.note_mapping = note_mapping
+
+        # Characters whose lowercase form is a note with an integer MIDI pitch
+        self._pitch_of = {}
+        for code in range(128):
+            note = note_mapping.get(chr(code).lower())
+            if isinstance(note, int) and 0 <= note < SEPARATOR_CODE:
+                self._pitch_of[code] = note
+
+        table = bytearray(range(256))
+        for code, pitch in self._pitch_of.items():
+            table[code] = pitch
+        table[ord(SEPARATOR)] = SEPARATOR_CODE
+        self._table = bytes(table)
+        self._delete = bytes(code for code in range(256) if code not in self._pitch_of)
+        # The chunk path keeps the separator so the translated chunk can be split per melody
+        self._chunk_delete = self._delete.replace(SEPARATOR.encode('ascii'), b'')
+
+    def _pitches_fallback(self, melody):
+        """Character-by-character path for non-ASCII melodies"""
+        notes = (self.note_mapping.get(char.lower()) for char in melody)
+        return np.array([note for note in notes if isinstance(note, int)], dtype=np.uint8)
+
+    def pitches(self, melody):
+        """
+        Convert one melody string to an array of MIDI pitches.
+
+        Returns:
+        - uint8 array of MIDI pitches, or 'skip' if the melody is incomplete
+        """
+        if SKIP_MARKER in melody:
+            return 'skip'
+        if not melody.isascii():
+            return self._pitches_fallback(melody)
+        return np.frombuffer(melody.encode('ascii').translate(self._table, self._delete), dtype=np.uint8)
+
+    def parse(self, melody):
+        """Convert one melody string to a list of MIDI pitches, or 'skip' if the melody is incomplete"""
+        pitches = self.pitches(melody)
+        return pitches if isinstance(pitches, str) else pitches.tolist()
+
+    def tokens(self, melody):
+        """
+        Yield the pauses and notes of a melody in order.
+
+        Yields:
+        - (pause_name, None) for a run of dashes, or ('note', pitch) for a note with an integer pitch
+        """
+        for match in TOKEN_PATTERN.finditer(melody):
+            token = match.group()
+            if token[0] == '-':
+                yield PAUSE_NAMES[token], None
+            else:
+                note = self.note_mapping.get(token.lower())
+                if isinstance(note, int):
+                    yield 'note', note
+
+    def parse_chunk(self, melodies):
+        """
+        Convert a chunk of melodies in one pass.
+
+        Missing (non-string) melodies are treated like incomplete ones.
+
+        Returns:
+        - pitches: uint8 array with the pitches of every melody back to back
+        - offsets: int64 array, melody i is pitches[offsets[i]:offsets[i + 1]]
+        - skipped: bool array, True for melodies that are incomplete or missing (they get no pitches)
+        """
+        melodies = [melody if isinstance(melody, str) else SKIP_MARKER for melody in melodies]
+        text = SEPARATOR.join(melodies)
+
+        if not text.isascii() or text.count(SEPARATOR) != len(melodies) - 1:
+            arrays = [self.pitches(melody) for melody in melodies]
+            skipped = np.array([isinstance(array, str) for array in arrays], dtype=bool)
+            arrays = [np.empty(0, dtype=np.uint8) if isinstance(array, str) else array for array in arrays]
+            lengths = np.array([len(array) for array in arrays], dtype=np.int64)
+            pitches = np.concatenate(arrays) if arrays else np.empty(0, dtype=np.uint8)
+        else:
+            # Find the incomplete melodies from the marker positions in the joined text
+            text_starts = np.zeros(len(melodies), dtype=np.int64)
+            np.cumsum([len(melody) + 1 for melody in melodies[:-1]], out=text_starts[1:])
+            marker_positions = [match.start() for match in re.finditer(re.escape(SKIP_MARKER), text)]
+            skipped = np.zeros(len(melodies), dtype=bool)
+            skipped[np.searchsorted(text_starts, marker_positions, side='right') - 1] = True
+
+            # One translate call for the whole chunk, then split it at the separators
+            data = np.frombuffer(text.encode('ascii').translate(self._table, self._chunk_delete), dtype=np.uint8)
+            is_separator = data == SEPARATOR_CODE
+            rows = np.cumsum(is_separator)
+            keep = ~is_separator & ~skipped[rows]
+            pitches = data[keep]
+            lengths = np.bincount(rows[keep], minlength=len(melodies))
+
+        offsets = np.zeros(len(melodies) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return pitches, offsets, skipped
+
+    def iter_chunks(self, melodies, chunk_size=4096):
+        """Stream (pitches, offsets, skipped) chunks out of an iterable of melody strings"""
+        chunk = []
+        for melody in melodies:
+            chunk.append(melody)
+            if len(chunk) == chunk_size:
+                yield self.parse_chunk(chunk)
+                chunk = []
+        if chunk:
+            yield self.parse_chunk(chunk)
+
+    def parse_many(self, melodies, chunk_size=4096):
+        """Convert many melodies to a list of pitch lists, with 'skip' for incomplete melodies"""
+        sequences = []
+        for pitches, offsets, skipped in self.iter_chunks(melodies, chunk_size):
+            values = pitches.tolist()
+            sequences.extend('skip' if skip else values[start:end]
+                             for start, end, skip in zip(offsets[:-1], offsets[1:], skipped))
+        return sequences
+
+
+_tokenizers = {}
+
+def get_tokenizer(note_mapping=NOTE_MAPPING):
+    """Return a cached tokenizer for a note mapping"""
+    key = frozenset(note_mapping.items())
+    if key not in _tokenizers:
+        _tokenizers[key] = VolpianoTokenizer(note_mapping)
+    return _tokenizers[key]
@@ -0,0 +1,164 @@
+from itertools import chain
+import os
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def parse_sequences(sequence_strings, decimals=None, dtype=np.float64):
+    """
+    Parse a column of stringified lists (e.g. '[0.1, 0.2]') into one flat buffer plus offsets.
+
+    Args:
+    - sequence_strings: Iterable of list strings, one melody per entry
+    - decimals: Round every value to this many decimals, or None to keep the parsed values
+    - dtype: dtype of the returned buffer
+
+    Returns:
+    - buffer: 1D array with every value of every sequence back to back
+    - offsets: 1D int64 array of length n_sequences + 1, sequence i is buffer[offsets[i]:offsets[i + 1]]
+    """
+    stripped = [s.strip().strip('[]').strip() for s in sequence_strings]
+    lengths = np.array([s.count(',') + 1 if s else 0 for s in stripped], dtype=np.int64)
+
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    # One C-level parse of the whole column instead of a float() call per note
+    buffer = np.fromstring(','.join(s for s in stripped if s), sep=',')
+    if len(buffer) != offsets[-1]:
+        raise ValueError("Could not parse every sequence into numbers")
+    if decimals is not None:
+        buffer = np.round(buffer, decimals)
+    return buffer.astype(dtype, copy=False), offsets
+
+
+def concat_sequences(sequences, dtype=np.float64):
+    """
+    Concatenate in-memory sequences (lists or arrays) into one flat buffer plus offsets.
+
+    Returns:
+    - buffer, offsets, as for parse_sequences
+    """
+    lengths = np.fromiter((len(sequence) for sequence in sequences), dtype=np.int64, count=len(sequences))
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    buffer = np.fromiter(chain.from_iterable(sequences), dtype=dtype, count=offsets[-1])
+    return buffer, offsets
+
+
+def take_sequences(buffer, offsets, rows):
+    """
+    Gather a subset of sequences from a flat buffer in one vectorized copy.
+
+    Args:
+    - buffer, offsets: Flat sequences, as returned by parse_sequences
+    - rows: Indices of the sequences to keep, in the order they should appear
+
+    Returns:
+    - buffer, offsets of the selected sequences
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    lengths = np.diff(offsets)[rows]
+    new_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=new_offsets[1:])
+    index = np.repeat(offsets[:-1][rows] - new_offsets[:-1], lengths) + np.arange(new_offsets[-1], dtype=np.int64)
+    return buffer[index], new_offsets
+
+
+def window_starts(offsets, window_size):
+    """
+    Start index (into the flat buffer) of every sliding window that has a next value to predict.
+
+    A sequence of length L yields L - window_size windows, matching the original per-row loop.
+    """
+    lengths = np.diff(offsets)
+    counts = np.maximum(lengths - window_size, 0)
+    # Position of each window within its own sequence, built without a Python loop over rows
+    first = np.repeat(offsets[:-1] - np.concatenate(([0], np.cumsum(counts)[:-1])), counts)
+    return first + np.arange(counts.sum(), dtype=np.int64)
+
+
+def sliding_windows(buffer, offsets, window_size, dtype=None):
+    """
+    Build the (X, y) training pairs from a flat pitch buffer with strided views.
+
+    Args:
+    - buffer: Flat array of all sequences back to back
+    - offsets: Sequence boundaries in the buffer, as returned by parse_sequences
+    - window_size: Number of notes in each input window
+    - dtype: dtype of the returned arrays, e.g. np.float32 to halve memory; defaults to the buffer dtype
+
+    Returns:
+    - X: Windows, shape (n_windows, window_size)
+    - y: The note following each window, shape (n_windows,)
+    """
+    if dtype is not None:
+        buffer = np.asarray(buffer, dtype=dtype)
+    starts = window_starts(offsets, window_size)
+    if len(starts) == 0:
+        return np.empty((0, window_size), dtype=buffer.dtype), np.empty(0, dtype=buffer.dtype)
+
+    # A view of every window in the buffer; only the selected rows are copied, in one allocation
+    windows = sliding_window_view(buffer, window_size)
+    return windows[starts], buffer[starts + window_size]
+
+
+class LazyWindows:
+    """
+    Sliding windows read on demand from a flat pitch buffer and an array of window start indices.
+
+    Only the buffer and the starts are kept in memory (or memory-mapped from disk); windows are
+    materialized for the rows that are indexed, so full-corpus training does not need an
+    (n_windows, window_size) matrix up front. Supports len(), .shape and indexing by int, slice
+    or index array, which is all the training code needs.
+    """
+    def __init__(self, buffer, starts, window_size, dtype=None):
+        self.buffer = buffer
+        self.starts = starts
+        self.window_size = window_size
+        self.dtype = np.dtype(dtype) if dtype is not None else buffer.dtype
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def shape(self):
+        return (len(self.starts), self.window_size)
+
+    def __getitem__(self, key):
+        windows = sliding_window_view(self.buffer, self.window_size)[self.starts[key]]
+        return np.asarray(windows, dtype=self.dtype)
+
+    def __array__(self, dtype=None, copy=None):
+        return self[:].astype(dtype or self.dtype, copy=False)
+
+    def targets(self):
+        """The note following each window"""
+        return np.asarray(self.buffer[self.starts + self.window_size], dtype=self.dtype)
+
+    def save(self, directory):
+        """Save the buffer and window starts as .npy files that can be memory-mapped"""
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, 'buffer.npy'), self.buffer)
+        np.save(os.path.join(directory, 'starts.npy'), self.starts)
+        np.save(os.path.join(directory, 'window_size.npy'), np.array(self.window_size))
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r', dtype=None):
+        """Load windows saved with save(), memory-mapping the buffer and starts by default"""
+        buffer = np.load(os.path.join(directory, 'buffer.npy'), mmap_mode=mmap_mode)
+        starts = np.load(os.path.join(directory, 'starts.npy'), mmap_mode=mmap_mode)
+        window_size = int(np.load(os.path.join(directory, 'window_size.npy')))
+        return cls(buffer, starts, window_size, dtype=dtype)
+
+
+def lazy_windows(buffer, offsets, window_size, dtype=None):
+    """
+    Build the (X, y) training pairs without materializing the windows.
+
+    Returns:
+    - X: LazyWindows over the buffer
+    - y: The note following each window, shape (n_windows,)
+    """
+    windows = LazyWindows(buffer, window_starts(offsets, window_size), window_size, dtype=dtype)
+    return windows, windows.targets()